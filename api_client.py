@@ -0,0 +1,102 @@
+import logging
+import time
+import importlib.util
+import httpx
+from telegram.request import HTTPXRequest
+import metrics
+from config import (
+    API_CONNECTION_POOL_SIZE,
+    API_MAX_KEEPALIVE_CONNECTIONS,
+    API_KEEPALIVE_EXPIRY,
+    API_HTTP_VERSION,
+    API_CONNECT_TIMEOUT,
+    API_READ_TIMEOUT,
+    API_WRITE_TIMEOUT,
+    API_POOL_TIMEOUT,
+    POLLING_CONNECTION_POOL_SIZE,
+    POLLING_CONNECT_TIMEOUT,
+    POLLING_READ_TIMEOUT,
+    POLLING_POOL_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+def _resolve_http_version(http_version):
+    """Fall back to HTTP/1.1 when HTTP/2 is requested but h2 is not installed."""
+    if http_version in ("2", "2.0") and importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed; using HTTP/1.1. "
+                       "Install python-telegram-bot[http2] to enable it.")
+        return "1.1"
+    return http_version
+
+def _make_event_hooks(role):
+    """
+    Build httpx event hooks that report pool wait time and connection reuse.
+
+    The request hook attaches an httpcore trace callback. The first trace event
+    fires once a connection has been taken from the pool, so the time up to that
+    point is the pool wait. A request that never opens a TCP connection reused a
+    kept-alive one.
+    """
+    async def on_request(request):
+        started = time.perf_counter()
+        state = {"acquired": False, "new_connection": False}
+
+        async def trace(event_name, info):
+            if not state["acquired"]:
+                state["acquired"] = True
+                metrics.record_timing(f"http.{role}.pool_wait", time.perf_counter() - started)
+            if event_name == "connection.connect_tcp.started":
+                state["new_connection"] = True
+
+        request.extensions["trace"] = trace
+        request.extensions["metrics_state"] = (started, state)
+
+    async def on_response(response):
+        started, state = response.request.extensions.get("metrics_state", (None, None))
+        if started is None:
+            return
+        metrics.record_timing(f"http.{role}.request", time.perf_counter() - started)
+        if state["new_connection"]:
+            metrics.increment(f"http.{role}.connections_opened")
+        else:
+            metrics.increment(f"http.{role}.connections_reused")
+
+    return {"request": [on_request], "response": [on_response]}
+
+def build_api_request():
+    """Request object used for edits, replies and every other Bot API call."""
+    return HTTPXRequest(
+        connection_pool_size=API_CONNECTION_POOL_SIZE,
+        connect_timeout=API_CONNECT_TIMEOUT,
+        read_timeout=API_READ_TIMEOUT,
+        write_timeout=API_WRITE_TIMEOUT,
+        pool_timeout=API_POOL_TIMEOUT,
+        http_version=_resolve_http_version(API_HTTP_VERSION),
+        httpx_kwargs={
+            "limits": httpx.Limits(
+                max_connections=API_CONNECTION_POOL_SIZE,
+                max_keepalive_connections=API_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=API_KEEPALIVE_EXPIRY,
+            ),
+            "event_hooks": _make_event_hooks("api"),
+        },
+    )
+
+def build_polling_request():
+    """
+    Dedicated request object for getUpdates.
+
+    The long-poll holds its connection open for the whole polling timeout, so it
+    gets its own small pool and can never make an edit wait for a connection.
+    """
+    return HTTPXRequest(
+        connection_pool_size=POLLING_CONNECTION_POOL_SIZE,
+        connect_timeout=POLLING_CONNECT_TIMEOUT,
+        read_timeout=POLLING_READ_TIMEOUT,
+        pool_timeout=POLLING_POOL_TIMEOUT,
+        http_version="1.1",
+        httpx_kwargs={
+            "event_hooks": _make_event_hooks("polling"),
+        },
+    )
@@ -1,8 +1,8 @@
 import os
 import logging
-from flask import Flask, render_template_string, jsonify
-from filter_manager import list_filters
-from bot import list_channels
+from flask import Flask, Response, request, make_response, render_template_string, jsonify
+import status_cache
+import stats_publisher
 
 logger = logging.getLogger(__name__)
 
@@ -67,25 +67,28 @@ STATUS_PAGE_TEMPLATE = """
 </html>
 """
 
+def _not_modified(etag):
+    """Return True if the client already has the representation with this ETag"""
+    return etag in request.if_none_match
+
 @app.route('/')
 def index():
     """Display bot status page"""
-    from config import SOURCE_TIMEZONE, TARGET_TIMEZONE
-    
     try:
-        # Get filters as string (strip Markdown formatting)
-        filters_text = list_filters().replace('`', '')
-        
-        # Get channels text
-        channels_text = list_channels().replace('`', '')
+        snapshot = status_cache.get_snapshot()
+        etag = f"html-{snapshot['etag']}"
+        if _not_modified(etag):
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
         
-        return render_template_string(
+        response = make_response(render_template_string(
             STATUS_PAGE_TEMPLATE,
-            filters=filters_text,
-            channels=channels_text,
-            source_tz=SOURCE_TIMEZONE,
-            target_tz=TARGET_TIMEZONE
-        )
+            filters=snapshot["filters_text"],
+            channels=snapshot["channels_text"],
+            source_tz=snapshot["data"]["source_timezone"],
+            target_tz=snapshot["data"]["target_timezone"]
+        ))
+        response.set_etag(etag)
+        return response
     except Exception as e:
         logger.error(f"Error rendering status page: {e}")
         return f"Error: {str(e)}", 500
@@ -94,18 +97,38 @@ def index():
 def status_api():
     """Return bot status as JSON"""
     try:
-        channels_list = list_channels().split('\n')
-        filters_list = list_filters().split('\n')
+        snapshot = status_cache.get_snapshot()
+        etag = snapshot["etag"]
+        if _not_modified(etag):
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
         
-        return jsonify({
-            "status": "online",
-            "channels_count": len(channels_list) - 1 if len(channels_list) > 1 else 0,
-            "filters_count": len(filters_list) - 2 if len(filters_list) > 2 else 0,
-        })
+        response = jsonify(snapshot["data"])
+        response.set_etag(etag)
+        return response
     except Exception as e:
         logger.error(f"Error in status API: {e}")
         return jsonify({"error": str(e)}), 500
 
+def _published_stats(section):
+    """Serve one section of the stats last published by the bot process."""
+    published = stats_publisher.load_published()
+    if published is None:
+        return jsonify({"error": "The bot has not published any stats yet"}), 503
+    data = dict(published[section])
+    data["published_at"] = published["published_at"]
+    data["age_seconds"] = published["age_seconds"]
+    return jsonify(data)
+
+@app.route('/api/metrics')
+def metrics_api():
+    """Return the bot's runtime metrics (HTTP pool usage, timings, counters) as JSON"""
+    return _published_stats("metrics")
+
+@app.route('/api/memstats')
+def memstats_api():
+    """Return the bot's memory usage, cache sizes and top allocators as JSON"""
+    return _published_stats("memstats")
+
 if __name__ == "__main__":
     # This code only runs when app.py is executed directly, not when imported
     port = int(os.environ.get("PORT", 5000))
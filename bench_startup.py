@@ -0,0 +1,46 @@
+"""
+Startup benchmark.
+
+Measures, in fresh interpreters, how long each role takes to import its
+modules and prepare the processing pipeline, with and without the pipeline
+snapshot. Run with: python bench_startup.py [runs]
+"""
+import os
+import sys
+import statistics
+import subprocess
+import time
+
+# Code executed in a fresh interpreter for each scenario
+SCENARIOS = {
+    "status": "import app; app.status_cache.get_snapshot()",
+    "bot (no snapshot)": "import bot, pipeline; pipeline.get_pipeline()",
+    "bot (snapshot)": "import bot, pipeline; pipeline.load_snapshot() or pipeline.get_pipeline()",
+    "combined": "import bot, app, pipeline; pipeline.load_snapshot() or pipeline.get_pipeline()",
+}
+
+def time_scenario(code, runs):
+    """Return wall-clock durations (seconds) of running code in new interpreters."""
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN=os.environ.get("TELEGRAM_BOT_TOKEN", "0:benchmark"))
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, env=env,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    # Make sure an up-to-date snapshot exists for the snapshot scenarios
+    time_scenario("import pipeline; pipeline.get_pipeline()", 1)
+
+    print(f"{'scenario':<20} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for name, code in SCENARIOS.items():
+        timings = time_scenario(code, runs)
+        print(f"{name:<20} {statistics.median(timings) * 1000:>10.1f} "
+              f"{min(timings) * 1000:>10.1f} {max(timings) * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
 import logging
 import asyncio
 import re
-import os
-import json
+import time
 from telegram import Bot, Update
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -14,97 +14,47 @@ from telegram.ext import (
 )
 from config import BOT_TOKEN, CHANNEL_ID, IS_ADMIN, PROCESS_TEXT, PROCESS_CAPTIONS, REPLY_ON_EDIT_FAILURE
 from utils import process_message_text
-from filter_manager import add_filter, remove_filter, list_filters, test_filter
+from filter_manager import add_filter, add_filters, remove_filter, list_filters, test_filter, check_filter
+from api_client import build_api_request, build_polling_request
+from polling import run_polling
+from channel_manager import add_channel, remove_channel, list_channels
+from pipeline import is_monitored_channel, load_snapshot, get_pipeline, apply_change
+from config import USE_PIPELINE_SNAPSHOT, PROCESSED_MESSAGES_CACHE_SIZE, PROCESSED_MESSAGES_TTL
+from config import ADMIN_USER_IDS, ALLOW_ANYONE_TO_MANAGE, MAX_BULK_FILTERS, BOT_API_BASE_URL
+from command_lane import management_command, post_started, post_finished
+from caches import BoundedCache, register_cache
+from memstats import collect_memstats, format_memstats, start_tracing
+import stats_publisher
 
-# File to store channels list
-CHANNELS_FILE = "monitored_channels.json"
-
-def load_channels():
-    """Load the list of channels to monitor from a JSON file."""
-    if not os.path.exists(CHANNELS_FILE):
-        # Create empty list with default channel from env var
-        channels = []
-        if CHANNEL_ID:
-            channels.append(CHANNEL_ID)
-        save_channels(channels)
-        return channels
-    
-    try:
-        with open(CHANNELS_FILE, 'r') as f:
-            channels = json.load(f)
-            return channels
-    except Exception as e:
-        logger.error(f"Error loading channels: {e}")
-        return [CHANNEL_ID] if CHANNEL_ID else []
-
-def save_channels(channels):
-    """Save the list of channels to monitor to a JSON file."""
-    try:
-        with open(CHANNELS_FILE, 'w') as f:
-            json.dump(channels, f, indent=2)
-        return True
-    except Exception as e:
-        logger.error(f"Error saving channels: {e}")
-        return False
+logger = logging.getLogger(__name__)
 
-def add_channel(channel_id):
-    """Add a channel to the list of monitored channels."""
-    channels = load_channels()
-    
-    # Normalize channel ID format
-    if channel_id.startswith('@'):
-        # Keep @ for usernames
-        normalized_id = channel_id
-    else:
-        # Ensure numeric IDs are strings without @
-        normalized_id = str(channel_id).replace('@', '')
+class ProcessedMessage:
+    """Bookkeeping record for a handled channel post."""
     
-    # Check if channel already exists
-    if normalized_id in channels:
-        return False, "Channel already in monitoring list."
+    __slots__ = ("chat_id", "message_id", "processed_at")
     
-    channels.append(normalized_id)
-    if save_channels(channels):
-        return True, f"Channel {normalized_id} added to monitoring list."
-    else:
-        return False, "Failed to save channel."
+    def __init__(self, chat_id, message_id, processed_at):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.processed_at = processed_at
 
-def remove_channel(channel_id):
-    """Remove a channel from the list of monitored channels."""
-    channels = load_channels()
-    initial_count = len(channels)
-    
-    # Normalize channel ID for comparison
-    normalized_id = str(channel_id).replace('@', '') if not channel_id.startswith('@') else channel_id
-    
-    # Check both formats (@username and username) for removal
-    if normalized_id in channels:
-        channels.remove(normalized_id)
-    elif f"@{normalized_id}" in channels:
-        channels.remove(f"@{normalized_id}")
-    elif normalized_id.replace('@', '') in channels:
-        channels.remove(normalized_id.replace('@', ''))
-    
-    if len(channels) < initial_count:
-        if save_channels(channels):
-            return True, f"Channel {channel_id} removed from monitoring list."
-    
-    return False, f"Channel {channel_id} not found in monitoring list."
+# Recently processed posts, bounded by size and age
+processed_messages = register_cache(
+    "processed_messages",
+    BoundedCache(PROCESSED_MESSAGES_CACHE_SIZE, ttl=PROCESSED_MESSAGES_TTL)
+)
 
-def list_channels():
-    """Get a formatted list of all monitored channels."""
-    channels = load_channels()
-    
-    if not channels:
-        return "No channels are being monitored."
-    
-    result = "Monitored channels:\n\n"
-    for i, channel in enumerate(channels, 1):
-        result += f"{i}. `{channel}`\n"
-    
-    return result
+def is_not_modified_error(error):
+    """Check if an edit failed only because the message already has that content."""
+    return "message is not modified" in str(error).lower()
 
-logger = logging.getLogger(__name__)
+async def persist(func, *args):
+    """
+    Run a filter/channel change off the event loop and rebuild the pipeline
+    there too. Posts keep using the previous pipeline until the new one is
+    ready, so they never wait for the change.
+    """
+    return await asyncio.to_thread(apply_change, func, *args)
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
@@ -125,44 +75,45 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/channels - List all monitored channels\n"
         "/addchannel channel_id - Add a channel to monitor\n"
         "/removechannel channel_id - Remove a channel from monitoring\n\n"
+        "Diagnostics:\n"
+        "/memstats - Show memory usage and cache sizes\n\n"
         "Filter management commands:\n"
         "/filters - List all current text filters\n"
         "/addfilter pattern replacement - Add a new filter\n"
+        "/addfilters - Add many filters at once, one 'pattern replacement' per line\n"
         "/removefilter pattern - Remove a filter\n"
         "/testfilter sample_text regex_pattern - Test a regex pattern on sample text"
     )
 
 async def process_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Process new channel posts."""
+    """Process new channel posts. Queued management commands wait until it is done."""
+    post_started()
+    try:
+        await handle_channel_post(update, context)
+    finally:
+        post_finished()
+
+async def handle_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Apply filters and timezone conversion to a channel post and edit it."""
     message = update.channel_post
     
     if not message:
         return
     
     # Check if the message is from a monitored channel
-    monitored_channels = load_channels()
-    channel_match = False
-    
-    for channel in monitored_channels:
-        # Handle both username format (@channel) and numeric ID format
-        if channel.startswith('@'):
-            # Username format - compare with channel username
-            if message.chat.username and message.chat.username.lower() == channel.replace('@', '').lower():
-                channel_match = True
-                break
-        else:
-            # Numeric ID format - compare with channel ID
-            if message.chat.id and str(message.chat.id) == channel:
-                channel_match = True
-                break
-    
-    if not channel_match and monitored_channels:
+    if not is_monitored_channel(message.chat.id, message.chat.username):
         logger.info(f"Ignoring message from non-monitored channel: {message.chat.id}")
         return
     
     # Log full message details for debugging
     logger.info(f"Message details: chat_id={message.chat.id}, username={message.chat.username}, text={message.text}")
     
+    # Skip posts already handled in this process (e.g. redelivered updates)
+    message_key = (message.chat.id, message.message_id)
+    if message_key in processed_messages:
+        logger.info(f"Skipping already processed message {message.message_id} from channel {message.chat.id}")
+        return
+    
     logger.info(f"Processing message {message.message_id} from channel {message.chat.id}")
     
     try:
@@ -171,7 +122,7 @@ async def process_channel_post(update: Update, context: ContextTypes.DEFAULT_TYP
             original_text = message.text
             logger.info(f"Original text before processing: '{original_text}'")
             
-            processed_text = process_message_text(original_text)
+            processed_text = process_message_text(original_text, reference_time=message.date)
             logger.info(f"Processed text after filters and time conversion: '{processed_text}'")
             
             # Only edit if the text has changed
@@ -184,8 +135,14 @@ async def process_channel_post(update: Update, context: ContextTypes.DEFAULT_TYP
             if processed_text != original_text:
                 try:
                     # Try to edit message directly
-                    await message.edit_text(processed_text, entities=message.entities)
-                    logger.info(f"Edited text message {message.message_id}")
+                    try:
+                        await message.edit_text(processed_text, entities=message.entities)
+                        logger.info(f"Edited text message {message.message_id}")
+                    except BadRequest as not_modified_error:
+                        # Already edited, e.g. the update was redelivered after a restart
+                        if not is_not_modified_error(not_modified_error):
+                            raise
+                        logger.info(f"Message {message.message_id} is already up to date")
                 except Exception as edit_error:
                     # If editing fails (e.g., no permission), try alternative method
                     logger.warning(f"Could not edit message directly: {edit_error}")
@@ -219,14 +176,20 @@ async def process_channel_post(update: Update, context: ContextTypes.DEFAULT_TYP
         # Process captions in media messages
         elif message.caption and PROCESS_CAPTIONS:
             original_caption = message.caption
-            processed_caption = process_message_text(original_caption)
+            processed_caption = process_message_text(original_caption, reference_time=message.date)
             
             # Only edit if the caption has changed
             if processed_caption != original_caption:
                 try:
                     # Try to edit caption directly
-                    await message.edit_caption(processed_caption, caption_entities=message.caption_entities)
-                    logger.info(f"Edited caption in message {message.message_id}")
+                    try:
+                        await message.edit_caption(processed_caption, caption_entities=message.caption_entities)
+                        logger.info(f"Edited caption in message {message.message_id}")
+                    except BadRequest as not_modified_error:
+                        # Already edited, e.g. the update was redelivered after a restart
+                        if not is_not_modified_error(not_modified_error):
+                            raise
+                        logger.info(f"Caption of message {message.message_id} is already up to date")
                 except Exception as edit_error:
                     # If editing fails, try alternative method
                     logger.warning(f"Could not edit caption directly: {edit_error}")
@@ -259,12 +222,22 @@ async def process_channel_post(update: Update, context: ContextTypes.DEFAULT_TYP
                 
     except Exception as e:
         logger.error(f"Error processing message {message.message_id}: {e}")
+    
+    processed_messages.put(message_key, ProcessedMessage(message.chat.id, message.message_id, time.time()))
 
+@management_command("memstats")
+async def memstats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Report memory usage, cache sizes and top allocators."""
+    stats = await asyncio.to_thread(collect_memstats)
+    await update.message.reply_text(format_memstats(stats))
+
+@management_command("filters")
 async def filters_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display all current filters."""
-    filters_text = list_filters()
+    filters_text = await asyncio.to_thread(list_filters)
     await update.message.reply_text(filters_text, parse_mode="Markdown")
 
+@management_command("addfilter")
 async def add_filter_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Add a new filter."""
     # Check arguments
@@ -280,23 +253,69 @@ async def add_filter_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     pattern = context.args[0]
     replacement = ' '.join(context.args[1:])
     
-    try:
-        # Test if pattern is valid regex
-        re.compile(pattern)
-        
-        # Add the filter
-        if add_filter(pattern, replacement):
-            await update.message.reply_text(
-                f"✅ Filter added successfully!\n\n"
-                f"Pattern: `{pattern}`\n"
-                f"Replacement: `{replacement}`",
-                parse_mode="Markdown"
-            )
-        else:
-            await update.message.reply_text("❌ Failed to add filter.")
-    except re.error as e:
-        await update.message.reply_text(f"❌ Invalid regular expression: {str(e)}")
+    # Test that the pattern and the replacement can be applied
+    error = check_filter(pattern, replacement)
+    if error:
+        await update.message.reply_text(f"❌ {error}")
+        return
+    
+    # Add the filter
+    if await persist(add_filter, pattern, replacement):
+        await update.message.reply_text(
+            f"✅ Filter added successfully!\n\n"
+            f"Pattern: `{pattern}`\n"
+            f"Replacement: `{replacement}`",
+            parse_mode="Markdown"
+        )
+    else:
+        await update.message.reply_text("❌ Failed to add filter.")
+
+@management_command("addfilters")
+async def add_filters_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Add several filters, one per line, with a single write."""
+    # Everything after the command, one "pattern replacement" per line
+    lines = update.message.text.split(None, 1)[1:]
+    lines = [line.strip() for line in lines[0].splitlines() if line.strip()] if lines else []
+    
+    if not lines:
+        await update.message.reply_text(
+            "❌ Usage: /addfilters followed by one filter per line:\n"
+            "pattern replacement\n\n"
+            "Example:\n"
+            "/addfilters\n"
+            "(?i)\\b(hello)\\b HELLO\n"
+            "(?i)\\b(bye)\\b BYE"
+        )
+        return
+    
+    if len(lines) > MAX_BULK_FILTERS:
+        await update.message.reply_text(f"❌ Too many filters: at most {MAX_BULK_FILTERS} per command.")
+        return
+    
+    # Validate everything first so nothing is saved if any line is wrong
+    new_filters = []
+    errors = []
+    for number, line in enumerate(lines, 1):
+        parts = line.split(None, 1)
+        if len(parts) < 2:
+            errors.append(f"Line {number}: missing replacement")
+            continue
+        error = check_filter(parts[0], parts[1])
+        if error:
+            errors.append(f"Line {number}: {error}")
+            continue
+        new_filters.append((parts[0], parts[1]))
+    
+    if errors:
+        await update.message.reply_text("❌ No filters were added:\n\n" + "\n".join(errors))
+        return
+    
+    if await persist(add_filters, new_filters):
+        await update.message.reply_text(f"✅ {len(new_filters)} filters added successfully!")
+    else:
+        await update.message.reply_text("❌ Failed to add filters.")
 
+@management_command("removefilter")
 async def remove_filter_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Remove a filter."""
     # Check arguments
@@ -312,11 +331,12 @@ async def remove_filter_command(update: Update, context: ContextTypes.DEFAULT_TY
     pattern = context.args[0]
     
     # Remove the filter
-    if remove_filter(pattern):
+    if await persist(remove_filter, pattern):
         await update.message.reply_text(f"✅ Filter with pattern `{pattern}` removed.", parse_mode="Markdown")
     else:
         await update.message.reply_text(f"❌ No filter found with pattern: `{pattern}`", parse_mode="Markdown")
 
+@management_command("testfilter")
 async def test_filter_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Test a regex pattern on sample text."""
     # Check arguments
@@ -339,11 +359,13 @@ async def test_filter_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     except re.error as e:
         await update.message.reply_text(f"❌ Invalid regular expression: {str(e)}")
 
+@management_command("channels")
 async def channels_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display all monitored channels."""
-    channels_text = list_channels()
+    channels_text = await asyncio.to_thread(list_channels)
     await update.message.reply_text(channels_text, parse_mode="Markdown")
 
+@management_command("addchannel")
 async def add_channel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Add a new channel to monitor."""
     # Check arguments
@@ -360,13 +382,14 @@ async def add_channel_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     channel_id = context.args[0]
     
     # Add the channel
-    success, message = add_channel(channel_id)
+    success, message = await persist(add_channel, channel_id)
     
     if success:
         await update.message.reply_text(f"✅ {message}")
     else:
         await update.message.reply_text(f"❌ {message}")
 
+@management_command("removechannel")
 async def remove_channel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Remove a channel from monitoring."""
     # Check arguments
@@ -383,7 +406,7 @@ async def remove_channel_command(update: Update, context: ContextTypes.DEFAULT_T
     channel_id = context.args[0]
     
     # Remove the channel
-    success, message = remove_channel(channel_id)
+    success, message = await persist(remove_channel, channel_id)
     
     if success:
         await update.message.reply_text(f"✅ {message}")
@@ -403,16 +426,40 @@ def start_bot():
     if not CHANNEL_ID:
         logger.warning("No channel ID provided. The bot will process all channels it's added to.")
     
-    # Create the Application instance
-    application = Application.builder().token(BOT_TOKEN).build()
+    if ALLOW_ANYONE_TO_MANAGE:
+        logger.warning("ALLOW_ANYONE_TO_MANAGE is set. Anyone can use the management commands.")
+    elif not ADMIN_USER_IDS:
+        logger.warning("No ADMIN_USER_IDS configured. Management commands are disabled.")
+    
+    start_tracing()
+    stats_publisher.start()
+    
+    # Load the precompiled pipeline snapshot, or build it now so the first
+    # post does not pay for reading and validating filters and channels
+    if not (USE_PIPELINE_SNAPSHOT and load_snapshot()):
+        get_pipeline()
+    
+    # Create the Application instance with separate connection pools for
+    # the getUpdates long-poll and for regular API calls (edits, replies)
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(BOT_API_BASE_URL)
+        .request(build_api_request())
+        .get_updates_request(build_polling_request())
+        .updater(None)
+        .build()
+    )
     
     # Add command handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     
-    # Add filter management command handlers
+    # Add filter management command handlers. They check admin rights and
+    # rate limits, then run on the command lane behind channel posts.
     application.add_handler(CommandHandler("filters", filters_command))
     application.add_handler(CommandHandler("addfilter", add_filter_command))
+    application.add_handler(CommandHandler("addfilters", add_filters_command))
     application.add_handler(CommandHandler("removefilter", remove_filter_command))
     application.add_handler(CommandHandler("testfilter", test_filter_command))
     
@@ -421,14 +468,18 @@ def start_bot():
     application.add_handler(CommandHandler("addchannel", add_channel_command))
     application.add_handler(CommandHandler("removechannel", remove_channel_command))
     
+    # Add diagnostics command handlers
+    application.add_handler(CommandHandler("memstats", memstats_command))
+    
     # Use UPDATE_TYPE.CHANNEL_POST filter instead of CHANNEL
     application.add_handler(MessageHandler(filters.UpdateType.CHANNEL_POST, process_channel_post))
     
     # Register error handler
     application.add_error_handler(error_handler)
     
-    # Start the Bot
+    # Start the Bot. The polling loop drains or persists in-flight updates on
+    # SIGTERM and only confirms updates to Telegram once they are handled.
     logger.info("Starting bot polling...")
-    application.run_polling()
+    asyncio.run(run_polling(application))
 
     return application
@@ -0,0 +1,98 @@
+import time
+import threading
+from collections import OrderedDict
+
+# Every long-lived cache in the bot is bounded. BoundedCache instances and
+# functools.lru_cache functions register here so /memstats can report them.
+_registry = {}
+
+class BoundedCache:
+    """
+    Thread-safe LRU cache with a maximum size and an optional time-to-live.
+
+    When full, the least recently used entry is evicted. Entries older than
+    ttl seconds are treated as missing and dropped when next accessed.
+    """
+
+    __slots__ = ("maxsize", "ttl", "_data", "_lock", "hits", "misses", "evictions")
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            stored_at, value = item
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store value under key, evicting the least recently used entry if full."""
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """Remove all entries."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Return size and hit/miss/eviction counts."""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+_MISSING = object()
+
+def register_cache(name, cache):
+    """Register a BoundedCache or lru_cache-decorated function for reporting."""
+    _registry[name] = cache
+    return cache
+
+def cache_stats():
+    """Return stats for every registered cache."""
+    stats = {}
+    for name, cache in _registry.items():
+        if isinstance(cache, BoundedCache):
+            stats[name] = cache.stats()
+        elif hasattr(cache, "cache_info"):
+            info = cache.cache_info()
+            stats[name] = {
+                "size": info.currsize,
+                "maxsize": info.maxsize,
+                "ttl": None,
+                "hits": info.hits,
+                "misses": info.misses,
+                "evictions": None,
+            }
+    return stats
@@ -0,0 +1,98 @@
+import json
+import os
+import logging
+import status_cache
+import pipeline
+from config import CHANNEL_ID
+
+logger = logging.getLogger(__name__)
+
+# File to store channels list
+CHANNELS_FILE = "monitored_channels.json"
+
+def load_channels():
+    """Load the list of channels to monitor from a JSON file."""
+    if not os.path.exists(CHANNELS_FILE):
+        # Create empty list with default channel from env var
+        channels = []
+        if CHANNEL_ID:
+            channels.append(CHANNEL_ID)
+        save_channels(channels)
+        return channels
+    
+    try:
+        with open(CHANNELS_FILE, 'r') as f:
+            channels = json.load(f)
+            return channels
+    except Exception as e:
+        logger.error(f"Error loading channels: {e}")
+        return [CHANNEL_ID] if CHANNEL_ID else []
+
+def save_channels(channels):
+    """Save the list of channels to monitor to a JSON file."""
+    try:
+        with open(CHANNELS_FILE, 'w') as f:
+            json.dump(channels, f, indent=2)
+        status_cache.invalidate()
+        pipeline.invalidate()
+        return True
+    except Exception as e:
+        logger.error(f"Error saving channels: {e}")
+        return False
+
+def add_channel(channel_id):
+    """Add a channel to the list of monitored channels."""
+    channels = load_channels()
+    
+    # Normalize channel ID format
+    if channel_id.startswith('@'):
+        # Keep @ for usernames
+        normalized_id = channel_id
+    else:
+        # Ensure numeric IDs are strings without @
+        normalized_id = str(channel_id).replace('@', '')
+    
+    # Check if channel already exists
+    if normalized_id in channels:
+        return False, "Channel already in monitoring list."
+    
+    channels.append(normalized_id)
+    if save_channels(channels):
+        return True, f"Channel {normalized_id} added to monitoring list."
+    else:
+        return False, "Failed to save channel."
+
+def remove_channel(channel_id):
+    """Remove a channel from the list of monitored channels."""
+    channels = load_channels()
+    initial_count = len(channels)
+    
+    # Normalize channel ID for comparison
+    normalized_id = str(channel_id).replace('@', '') if not channel_id.startswith('@') else channel_id
+    
+    # Check both formats (@username and username) for removal
+    if normalized_id in channels:
+        channels.remove(normalized_id)
+    elif f"@{normalized_id}" in channels:
+        channels.remove(f"@{normalized_id}")
+    elif normalized_id.replace('@', '') in channels:
+        channels.remove(normalized_id.replace('@', ''))
+    
+    if len(channels) < initial_count:
+        if save_channels(channels):
+            return True, f"Channel {channel_id} removed from monitoring list."
+    
+    return False, f"Channel {channel_id} not found in monitoring list."
+
+def list_channels():
+    """Get a formatted list of all monitored channels."""
+    channels = load_channels()
+    
+    if not channels:
+        return "No channels are being monitored."
+    
+    result = "Monitored channels:\n\n"
+    for i, channel in enumerate(channels, 1):
+        result += f"{i}. `{channel}`\n"
+    
+    return result
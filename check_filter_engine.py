@@ -0,0 +1,87 @@
+"""
+Differential check for the filter engine.
+
+Builds random filter lists and random texts and verifies that FilterEngine
+gives exactly the same output as applying the filters one after another
+with re.sub, including after hit-count based re-planning.
+Run with: python check_filter_engine.py [iterations] [seed]
+"""
+import re
+import sys
+import random
+import logging
+from pipeline import FilterEntry
+from stages import literal_prefilter
+from filter_engine import FilterEngine, build_plan
+
+# Building blocks for random filters and texts. They are chosen to collide:
+# shared letters, case variants, word and non-word symbols, emoji and the
+# special case-insensitive characters ſ, K, İ and ı.
+PATTERNS = [
+    r"urgent", r"(?i)\b(urgent)\b", r"(?i)\b(important)\b", r"@Gazew_07", r"(?i)\b(@Gazew_07)\b",
+    r"🚧", r"(?i)\b(🚧)\b", r"🚀", r"\d+", r"[0-9]{2}", r"x+y", r"(?i)sk(ip)?", r"kelvin",
+    r"(ab|cd)", r"\bfoo\b", r"bar", r"baz", r"!+", r"\?", r"(?i)İ", r"ı", r"^start", r"end$",
+    r"(a)\1", r"(?P<w>q)", r"(?x) z  z  # two zeds", r"\s+", r"(?=n)n", r"[#&%]", r"\B-\B",
+    r"(?i)[m-p]", r"(?a)\bword\b", r"é", r"(?i)É",
+    r"abc", r"bcd", r"cab", r"xyz", r"yzx", r"zz", r"foobar", r"oba", r"ur", r"gent",
+]
+REPLACEMENTS = [
+    "URGENT", "IMPORTANT", "@BILLIONAIREBOSS101", "🚀", "🚧", "", "#", "&&", "N", r"<\1>", "x", "ſ",
+    "K", "İ", "-", "foo", "bar", " ", "word", r"\g<0>\g<0>", "€",
+    "abc", "ca", "bcd", "xyz", "zy", "ob", "gentur",
+    # Invalid for most or all patterns; such filters must be skipped, not abort the rest
+    r"\1", r"\2", r"\g<missing>",
+]
+TEXT_PIECES = [
+    "urgent", "URGENT", "UrGeNt", "important", "@Gazew_07", "@gazew_07", "🚧", "🚀", "12", "7", "xxy",
+    "skip", "ſkip", "SK", "kelvin", "Kelvin", "ab", "cd", "foo", "bar", "baz", "!!", "?", "İ", "ı",
+    "start", "end", "aa", "q", "zz", " ", "\n", "n", "#", "-", "a-b", "word", "é", "É", "m", "P",
+    "abc", "bc", "ca", "xy", "yz", "zx", "foob", "ar", "gen", "t",
+]
+
+def sequential(filters, text):
+    """Reference implementation: apply filters one after another, skipping ones that fail."""
+    for pattern, replacement in filters:
+        try:
+            text = re.sub(pattern, replacement, text)
+        except (re.error, IndexError):
+            # Bad group references (\2, \g<missing>) fail when the replacement is compiled
+            continue
+    return text
+
+def random_filters(rng):
+    """Pick a random filter list. Replacements may be invalid for their pattern."""
+    return [(rng.choice(PATTERNS), rng.choice(REPLACEMENTS)) for _ in range(rng.randint(1, 8))]
+
+def random_text(rng):
+    return "".join(rng.choice(TEXT_PIECES) + rng.choice(["", " ", ".", "_"]) for _ in range(rng.randint(0, 12)))
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    rng = random.Random(seed)
+    logging.disable(logging.ERROR)
+
+    failures = 0
+    grouped = 0
+    for _ in range(iterations):
+        filters = random_filters(rng)
+        entries = [FilterEntry(re.compile(p), r, literal_prefilter(re.compile(p))) for p, r in filters]
+        engine = FilterEngine(entries)
+        grouped += sum(1 for step in engine.plan if len(step.entries) > 1)
+        for round_number in range(20):
+            text = random_text(rng)
+            expected = sequential(filters, text)
+            actual = engine.apply(text)
+            if actual != expected:
+                failures += 1
+                print(f"MISMATCH filters={filters!r} text={text!r}\n  expected={expected!r}\n  actual={actual!r}")
+            if round_number == 10:
+                # Re-plan with the collected hits, as the engine does periodically
+                engine.plan = build_plan(engine.groups, engine.hits)
+
+    print(f"{iterations} filter sets checked, {grouped} multi-filter groups, {failures} mismatches")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import time
+import asyncio
+import logging
+import functools
+from collections import deque
+import metrics
+from caches import BoundedCache, register_cache
+from config import (
+    ADMIN_USER_IDS, ALLOW_ANYONE_TO_MANAGE, COMMAND_RATE_LIMIT, COMMAND_RATE_WINDOW,
+    COMMAND_QUEUE_SIZE, COMMAND_LANE_MAX_DEFER, COMMAND_RATE_CACHE_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Low-priority lane for management commands.
+#
+# The polling loop handles updates one after another, so a command handler
+# that is awaited inline holds up every channel post behind it in the batch.
+# Management commands therefore only pass the in-memory admin and rate limit
+# checks inline and are then queued. A single worker runs queued commands in
+# order (so two edits of the same JSON file never interleave), and before each
+# command waits until no channel post is being processed, for at most
+# COMMAND_LANE_MAX_DEFER seconds so a busy channel cannot starve commands.
+#
+# A command's update is confirmed to Telegram once it is queued. On shutdown,
+# drain() gives the lane what is left of the drain deadline and returns the
+# updates of commands that did not finish, so the polling loop can persist
+# them together with unprocessed posts.
+_queue = None
+_worker_task = None
+_current = None  # Queue item of the command being run
+_active_posts = 0
+_posts_idle = None
+
+# Times of recent commands per user, for the sliding window rate limit
+_command_times = register_cache(
+    "command_rate_limits",
+    BoundedCache(COMMAND_RATE_CACHE_SIZE, ttl=COMMAND_RATE_WINDOW)
+)
+# Users already told about the rate limit in the current window
+_rate_limit_notices = register_cache(
+    "command_rate_limit_notices",
+    BoundedCache(COMMAND_RATE_CACHE_SIZE, ttl=COMMAND_RATE_WINDOW)
+)
+
+def is_admin(user):
+    """Check whether a user may use management commands (nobody if no admins are configured)."""
+    if ALLOW_ANYONE_TO_MANAGE:
+        return True
+    return user is not None and user.id in ADMIN_USER_IDS
+
+def allow_command(user_id):
+    """Record a command for user_id and check it against the per-user rate limit."""
+    now = time.monotonic()
+    times = _command_times.get(user_id)
+    if times is None:
+        times = deque()
+    while times and now - times[0] > COMMAND_RATE_WINDOW:
+        times.popleft()
+    if len(times) >= COMMAND_RATE_LIMIT:
+        return False
+    times.append(now)
+    _command_times.put(user_id, times)
+    return True
+
+def _idle_event():
+    global _posts_idle
+    if _posts_idle is None:
+        _posts_idle = asyncio.Event()
+        _posts_idle.set()
+    return _posts_idle
+
+def post_started():
+    """Mark a channel post as being processed; queued commands wait for it."""
+    global _active_posts
+    _active_posts += 1
+    _idle_event().clear()
+
+def post_finished():
+    """Mark a channel post as done."""
+    global _active_posts
+    _active_posts -= 1
+    if _active_posts <= 0:
+        _active_posts = 0
+        _idle_event().set()
+
+async def _wait_for_idle_posts():
+    """Wait until no post is being processed, or COMMAND_LANE_MAX_DEFER passes."""
+    idle = _idle_event()
+    if idle.is_set():
+        return
+    started = time.monotonic()
+    deadline = started + COMMAND_LANE_MAX_DEFER
+    # The next post of a batch may start before this task wakes up, so
+    # check again after every wake-up
+    while not idle.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.info(f"Running queued command after deferring {COMMAND_LANE_MAX_DEFER}s for busy channels")
+            break
+        try:
+            await asyncio.wait_for(idle.wait(), remaining)
+        except asyncio.TimeoutError:
+            pass
+    metrics.record_timing("commands.deferred", time.monotonic() - started)
+
+async def _worker():
+    """Run queued commands one at a time until the queue is empty."""
+    global _worker_task, _current
+    try:
+        while not _queue.empty():
+            _current = _queue.get_nowait()
+            name, job, queued_at, _ = _current
+            await _wait_for_idle_posts()
+            metrics.record_timing("commands.queue_wait", time.monotonic() - queued_at)
+            started = time.monotonic()
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"Command /{name} failed: {e}")
+                metrics.increment("commands.failed")
+            metrics.record_timing("commands.run", time.monotonic() - started)
+            _current = None
+    finally:
+        _worker_task = None
+
+def submit(name, job, update=None):
+    """
+    Queue a coroutine function to run on the command lane.
+
+    Args:
+        update: The Update the command came from; it is returned by drain()
+            if the command has not finished by shutdown
+
+    Returns:
+        False if the queue is full and the command was dropped
+    """
+    global _queue, _worker_task
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=COMMAND_QUEUE_SIZE)
+    try:
+        _queue.put_nowait((name, job, time.monotonic(), update))
+    except asyncio.QueueFull:
+        logger.warning(f"Command queue full, dropping /{name}")
+        metrics.increment("commands.dropped")
+        return False
+    metrics.increment("commands.queued")
+    if _worker_task is None:
+        _worker_task = asyncio.create_task(_worker(), name="command_lane")
+    return True
+
+async def drain(timeout):
+    """
+    Let queued commands run for up to timeout seconds, then stop the lane.
+
+    Returns:
+        Updates of the commands that did not finish, in queue order
+    """
+    global _current
+    task = _worker_task
+    if task is not None and not task.done():
+        logger.info(f"Stopping: waiting up to {timeout:.1f}s for {_queue.qsize() + 1} queued commands")
+        done, _ = await asyncio.wait({task}, timeout=max(timeout, 0))
+        if not done:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    items = [_current] if _current is not None else []
+    _current = None
+    while _queue is not None and not _queue.empty():
+        items.append(_queue.get_nowait())
+    leftovers = [update for _, _, _, update in items if update is not None]
+    if leftovers:
+        metrics.increment("commands.persisted", len(leftovers))
+    return leftovers
+
+def management_command(name):
+    """
+    Decorator for management command handlers: checks that the user is an
+    admin and within the rate limit, then runs the handler on the command lane.
+
+    Commands from users who are not admins are ignored without a reply, so
+    they cost no API calls.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update, context):
+            user = update.effective_user
+            if not is_admin(user):
+                logger.warning(f"Ignoring /{name} from non-admin user {user.id if user else None}")
+                metrics.increment("commands.denied")
+                return
+
+            if not allow_command(user.id if user else None):
+                logger.warning(f"Rate limit exceeded for /{name} by user {user.id if user else None}")
+                metrics.increment("commands.rate_limited")
+                if user is None or user.id in _rate_limit_notices:
+                    return
+                _rate_limit_notices.put(user.id, True)
+                submit(name, lambda: update.effective_message.reply_text(
+                    f"⏳ Too many commands. The limit is {COMMAND_RATE_LIMIT} "
+                    f"per {COMMAND_RATE_WINDOW:g} seconds, please try again shortly."
+                ))
+                return
+
+            submit(name, lambda: handler(update, context), update)
+        return wrapper
+    return decorator
@@ -3,6 +3,10 @@ import os
 # Telegram Bot Token (get from BotFather)
 BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN")
 
+# Bot API server URL the token is appended to. Point it at a local server
+# such as fake_bot_api.py to run the bot without Telegram (e.g. load tests).
+BOT_API_BASE_URL = os.environ.get("BOT_API_BASE_URL", "https://api.telegram.org/bot")
+
 # Channel ID to monitor (including the @ symbol if it's a public channel)
 CHANNEL_ID = os.environ.get("CHANNEL_ID")
 
@@ -10,6 +14,29 @@ CHANNEL_ID = os.environ.get("CHANNEL_ID")
 # Set to False if the bot is the owner of the channel
 IS_ADMIN = False  # Try with False to see if it helps with permissions
 
+# Telegram user IDs allowed to use management commands (/addfilter,
+# /addchannel, /memstats, ...), comma-separated in ADMIN_USER_IDS. When empty,
+# management commands are refused, unless ALLOW_ANYONE_TO_MANAGE=1 explicitly
+# opens them to everyone who can message the bot. (IS_ADMIN above is about the
+# bot's own role in the channel, not about who may command it.)
+ADMIN_USER_IDS = frozenset(
+    int(user_id) for user_id in os.environ.get("ADMIN_USER_IDS", "").split(",") if user_id.strip()
+)
+ALLOW_ANYONE_TO_MANAGE = os.environ.get("ALLOW_ANYONE_TO_MANAGE", "0") == "1"
+
+# Per-user rate limit for management commands
+COMMAND_RATE_LIMIT = 10  # Commands allowed per window
+COMMAND_RATE_WINDOW = 60.0  # Seconds
+
+# Management commands run on a separate lane after channel posts: queued
+# commands wait until no post is being processed, but at most
+# COMMAND_LANE_MAX_DEFER seconds. Commands beyond COMMAND_QUEUE_SIZE are dropped.
+COMMAND_QUEUE_SIZE = 100
+COMMAND_LANE_MAX_DEFER = 5.0
+
+# Maximum number of filters accepted by one /addfilters command
+MAX_BULK_FILTERS = 200
+
 # Source timezone - UTC+14:00
 SOURCE_TIMEZONE = "Etc/GMT-14"  # Note: pytz uses opposite sign convention
 
@@ -36,6 +63,62 @@ ADDITIONAL_TIME_PATTERNS = [
     r"(\d{1,2}[/.:-]\d{1,2}[/.:-]\d{2,4})"  # Just date like 01/15/2023
 ]
 
+# Time-only timestamps (e.g. 23:30) are placed on the post's date in the source
+# timezone. If converting moves them to another day, DAY_ROLLOVER_FORMAT is
+# appended, e.g. "10:00 (-1d)".
+SHOW_DAY_ROLLOVER = True
+DAY_ROLLOVER_FORMAT = " ({days:+d}d)"
+
+# Memory budget mode shrinks every cache for small containers.
+# Enable with MEMORY_BUDGET_MODE=1.
+MEMORY_BUDGET_MODE = os.environ.get("MEMORY_BUDGET_MODE", "0") == "1"
+
+# Cache sizes for timezone offset tables (one per reference day of time-only
+# timestamps) and for parsed timestamp strings
+TIMEZONE_TABLE_CACHE_SIZE = 8 if MEMORY_BUDGET_MODE else 64
+TIMESTAMP_PARSE_CACHE_SIZE = 128 if MEMORY_BUDGET_MODE else 1024
+
+# Recently processed posts, kept to skip duplicate deliveries
+PROCESSED_MESSAGES_CACHE_SIZE = 500 if MEMORY_BUDGET_MODE else 5000
+PROCESSED_MESSAGES_TTL = 3600  # Seconds
+
+# Literal prefixes of filter texts, used to analyse which filters can share
+# a group
+FILTER_PREFIX_CACHE_SIZE = 512 if MEMORY_BUDGET_MODE else 4096
+# Users tracked by the management command rate limit
+COMMAND_RATE_CACHE_SIZE = 100 if MEMORY_BUDGET_MODE else 1000
+
+# tracemalloc frames to record for /memstats (0 disables tracing, which has
+# a noticeable CPU and memory cost)
+TRACEMALLOC_FRAMES = int(os.environ.get("TRACEMALLOC_FRAMES", "0"))
+MEMSTATS_TOP_ALLOCATORS = 10
+
+# The bot publishes its metrics and memory stats to this file every
+# BOT_STATS_INTERVAL seconds; /api/metrics and /api/memstats serve it, so
+# they work when the status page runs in a separate process
+BOT_STATS_FILE = "bot_stats.json"
+BOT_STATS_INTERVAL = 15.0
+
+# Cheap check run before timestamp conversion: it must match any text that
+# TIME_PATTERN or ADDITIONAL_TIME_PATTERNS can match. Posts without it skip
+# the timezone stage. Update it together with the patterns above.
+TIMEZONE_PREFILTER = r"\d[/.:-]\d"
+
+# Processing stages run on each post, in order. Built-in stages are
+# "text_filters" and "timezone_conversion"; custom stages can be added as
+# "module:function", where the function takes the pipeline dict and returns
+# a stages.Stage whose run(text, reference_time) does the work. Each stage
+# is skipped when its prefilter does not match.
+PIPELINE_STAGES = ["text_filters", "timezone_conversion"]
+
+# Apply text filters with a plan that groups filters which provably cannot
+# affect each other, so each group needs only one round of prefilter checks
+# and only the filters that can match run. Output is identical to applying
+# them one by one. The plan is re-ordered by hit counts every
+# FILTER_REPLAN_INTERVAL posts.
+ADAPTIVE_FILTER_ORDERING = True
+FILTER_REPLAN_INTERVAL = 200
+
 # Message types to process (set to True to enable processing)
 PROCESS_TEXT = True
 PROCESS_CAPTIONS = True  # For media messages with captions
@@ -43,3 +126,40 @@ PROCESS_CAPTIONS = True  # For media messages with captions
 # If set to True, the bot will reply with the corrected text
 # when it cannot edit the message directly (useful as a fallback)
 REPLY_ON_EDIT_FAILURE = True
+
+# Bot API HTTP connection settings for edits, replies and commands.
+# HTTP/2 needs the optional h2 package (python-telegram-bot[http2]);
+# without it the bot falls back to HTTP/1.1.
+API_CONNECTION_POOL_SIZE = 16
+API_MAX_KEEPALIVE_CONNECTIONS = 16
+API_KEEPALIVE_EXPIRY = 60.0  # Seconds an idle connection is kept open
+API_HTTP_VERSION = "2"
+API_CONNECT_TIMEOUT = 5.0
+API_READ_TIMEOUT = 10.0
+API_WRITE_TIMEOUT = 10.0
+API_POOL_TIMEOUT = 2.0
+
+# Separate connection settings for the getUpdates long-poll, so it never
+# occupies a connection that an edit is waiting for
+POLLING_CONNECTION_POOL_SIZE = 1
+POLLING_TIMEOUT = 30  # Long-poll duration passed to getUpdates
+POLLING_CONNECT_TIMEOUT = 5.0
+POLLING_READ_TIMEOUT = 5.0  # Added on top of POLLING_TIMEOUT by the library
+POLLING_POOL_TIMEOUT = 1.0
+
+# Seconds between on-disk change checks for the cached status page snapshot
+STATUS_CACHE_TTL = 5.0
+
+# Pipeline snapshot: validated filters and channels plus the filter analysis
+# (literal prefilters, groups of independent filters). When enabled it is
+# written after every rebuild and loaded at startup if the filters/channels
+# files have not changed since, so boot only has to compile the patterns.
+USE_PIPELINE_SNAPSHOT = True
+PIPELINE_SNAPSHOT_FILE = "pipeline_snapshot.json"
+# Seconds between checks for filters/channels files edited outside the bot
+PIPELINE_RELOAD_INTERVAL = 5.0
+
+# Graceful shutdown: seconds to let in-flight updates finish after SIGTERM
+# before the rest is written to PENDING_UPDATES_FILE and resumed on next start
+SHUTDOWN_DRAIN_TIMEOUT = 20.0
+PENDING_UPDATES_FILE = "pending_updates.json"
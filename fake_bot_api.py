@@ -0,0 +1,241 @@
+"""
+Local fake Telegram Bot API server for load tests.
+
+Implements the methods the bot uses (getMe, getUpdates, editMessageText,
+editMessageCaption, sendMessage; anything else answers True) with
+configurable response latency, 429 flood-control errors and permission
+errors. Channel posts are queued with add_post() and served through
+getUpdates long polling; every edit is recorded with its time so load_test.py
+can compute end-to-end latency.
+
+It can also run on its own for manual testing:
+    python fake_bot_api.py [port]
+then start the bot with BOT_API_BASE_URL=http://127.0.0.1:<port>/bot and
+queue raw updates with POST /fake/update (JSON body) or read GET /fake/stats.
+"""
+import sys
+import json
+import time
+import random
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Error responses, as returned by the real Bot API
+PERMISSION_ERRORS = [
+    (400, "Bad Request: message can't be edited"),
+    (403, "Forbidden: bot is not a member of the channel chat"),
+]
+
+class FakeBotAPI:
+    """
+    In-process fake Bot API server.
+
+    Args:
+        latency: Seconds added to every edit and send call
+        jitter: Maximum extra random seconds on top of latency
+        rate_limit_ratio: Share of edit/send calls answered with 429
+        retry_after: retry_after value (seconds) sent with 429 responses
+        permission_error_ratio: Share of edit/send calls answered with a
+            permission error
+        seed: Random seed for jitter and error injection
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 rate_limit_ratio=0.0, retry_after=1, permission_error_ratio=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.permission_error_ratio = permission_error_ratio
+        self._random = random.Random(seed)
+
+        self._condition = threading.Condition()
+        self._updates = []  # Update dicts not yet confirmed by an offset
+        self._next_update_id = 1
+        self._next_message_id = {}
+
+        # (chat_id, message_id) -> time the post was queued
+        self.posted_at = {}
+        # (chat_id, message_id) -> time of the first successful edit
+        self.edited_at = {}
+        self.calls = {}
+        self.errors = {}
+
+        server = self
+        class Handler(_Handler):
+            api = server
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Value for BOT_API_BASE_URL."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_update(self, update):
+        """Queue a raw update dict; update_id is assigned. Returns the update_id."""
+        with self._condition:
+            update = dict(update, update_id=self._next_update_id)
+            self._next_update_id += 1
+            self._updates.append(update)
+            self._condition.notify_all()
+            return update["update_id"]
+
+    def add_post(self, chat_id, text, caption=False):
+        """Queue a channel post with text (or a photo with that caption). Returns (chat_id, message_id)."""
+        with self._condition:
+            message_id = self._next_message_id.get(chat_id, 1)
+            self._next_message_id[chat_id] = message_id + 1
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "channel", "title": f"Channel {chat_id}"},
+        }
+        if caption:
+            message["photo"] = [{"file_id": "photo", "file_unique_id": "photo", "width": 1, "height": 1}]
+            message["caption"] = text
+        else:
+            message["text"] = text
+        key = (chat_id, message_id)
+        self.posted_at[key] = time.perf_counter()
+        self.add_update({"channel_post": message})
+        return key
+
+    def stats(self):
+        """Return call and error counts."""
+        with self._condition:
+            return {
+                "calls": dict(self.calls),
+                "errors": dict(self.errors),
+                "posts": len(self.posted_at),
+                "edited": len(self.edited_at),
+                "pending_updates": len(self._updates),
+            }
+
+    def _count(self, table, key):
+        with self._condition:
+            table[key] = table.get(key, 0) + 1
+
+    def get_updates(self, params):
+        """Long-poll: confirm updates below offset, then wait for new ones."""
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        deadline = time.monotonic() + float(params.get("timeout") or 0)
+        with self._condition:
+            if offset:
+                self._updates = [u for u in self._updates if u["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self._updates[:limit]
+
+    def edit_or_send(self, method, params):
+        """Answer an edit or send call after the configured latency, possibly with an injected error."""
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+        roll = self._random.random()
+        if roll < self.rate_limit_ratio:
+            self._count(self.errors, "429")
+            return 429, {
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        if roll < self.rate_limit_ratio + self.permission_error_ratio:
+            code, description = self._random.choice(PERMISSION_ERRORS)
+            self._count(self.errors, str(code))
+            return code, {"ok": False, "error_code": code, "description": description}
+
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": int(params.get("message_id") or 0),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "channel"},
+        }
+        if method == "editMessageCaption":
+            message["caption"] = params.get("caption", "")
+        else:
+            message["text"] = params.get("text", "")
+        if method != "sendMessage":
+            key = (chat_id, message["message_id"])
+            with self._condition:
+                self.edited_at.setdefault(key, time.perf_counter())
+        return 200, {"ok": True, "result": message}
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    api = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_params(self):
+        """Parse form-encoded or JSON request parameters."""
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        content_type = self.headers.get("Content-Type", "")
+        if not body:
+            return {}
+        if "json" in content_type:
+            return json.loads(body)
+        return {key: values[0] for key, values in urllib.parse.parse_qs(body.decode()).items()}
+
+    def _reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/fake/stats":
+            self._reply(200, self.api.stats())
+        else:
+            self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+    def do_POST(self):
+        params = self._read_params()
+        if self.path == "/fake/update":
+            self._reply(200, {"ok": True, "result": self.api.add_update(params)})
+            return
+
+        method = self.path.rsplit("/", 1)[-1]
+        self.api._count(self.api.calls, method)
+        if method == "getMe":
+            self._reply(200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}})
+        elif method == "getUpdates":
+            self._reply(200, {"ok": True, "result": self.api.get_updates(params)})
+        elif method in ("editMessageText", "editMessageCaption", "sendMessage"):
+            self._reply(*self.api.edit_or_send(method, params))
+        else:
+            self._reply(200, {"ok": True, "result": True})
+
+def main():
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    api = FakeBotAPI(port=port)
+    print(f"Fake Bot API listening, set BOT_API_BASE_URL={api.base_url}")
+    try:
+        api._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
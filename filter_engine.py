@@ -0,0 +1,324 @@
+import re
+import logging
+import threading
+from functools import lru_cache
+from collections import namedtuple
+import metrics
+from stages import prefilter_matches
+from caches import register_cache
+from config import FILTER_REPLAN_INTERVAL, FILTER_PREFIX_CACHE_SIZE
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+logger = logging.getLogger(__name__)
+
+# Filter engine that produces exactly the same text as applying the filters
+# one after another, while checking and running as few of them as possible.
+#
+# Two filters are independent when neither can create, destroy or change a
+# match of the other. For plain string filters this holds when none of their
+# patterns and replacements overlap. In general it holds when the characters
+# one can match do not overlap with the characters the other can match or
+# write, both always match and write at least one character, and word
+# boundaries (\b) are not affected. A filter may be moved past later filters
+# only if it is independent of all of them, so filters are gathered into
+# groups of mutually independent filters. Anything the analysis cannot prove
+# stays in its original place.
+#
+# Within a group every prefilter is checked once against the group's input.
+# Then only the filters that can match run, most frequent first. Order
+# inside a group cannot change the result. Hit counts also decide the order
+# of the stage-level prefilter check, so it usually stops at the first
+# filter. (Merging a group into one alternation regex was measured to be
+# slower than separate passes in CPython.)
+
+# Characters (lowercase) that re matches case-insensitively with more than
+# their plain upper/lower case form
+_EXTRA_CASE_VARIANTS = {"i": "İı", "k": "K", "s": "ſ"}
+
+# Character ranges larger than this are treated as "any character"
+_MAX_RANGE = 256
+
+_WORD = re.compile(r"\w")
+_ASCII_WORD = re.compile(r"\w", re.ASCII)
+
+# What a filter can read and write.
+# chars: frozenset of characters a match can consume (None = unknown/any)
+# output_chars: characters the replacement can produce (None = unknown/any)
+# word_context: the pattern uses \b or \B
+# ascii: \b follows ASCII word characters (re.ASCII)
+# min_output: the replacement always writes at least one character
+# literal: the exact text the pattern matches, if it is a plain
+#     case-sensitive string without assertions (else None)
+# output_literal: the exact replacement text if it has no group references
+# analysable: the pattern only uses constructs the analysis understands
+Footprint = namedtuple("Footprint", [
+    "chars", "output_chars", "word_context", "ascii", "min_width", "min_output",
+    "literal", "output_literal", "analysable",
+])
+
+# One step of a plan: a group of mutually independent filters
+PlanStep = namedtuple("PlanStep", ["entries"])
+
+class _Unknown(Exception):
+    """Raised when a pattern uses a construct the analysis does not cover."""
+
+def _variants(char, ignorecase):
+    """Characters a literal matches, including case variants under IGNORECASE."""
+    if not ignorecase:
+        return {char}
+    if not char.isascii():
+        if char.lower() == char.upper():
+            return {char}
+        raise _Unknown("non-ASCII cased literal with IGNORECASE")
+    lower = char.lower()
+    return {char, lower, char.upper()} | set(_EXTRA_CASE_VARIANTS.get(lower, ""))
+
+def _collect(items, flags, chars, info):
+    """Walk a parsed pattern, collecting consumable characters into chars."""
+    ignorecase = bool(flags & re.IGNORECASE)
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            chars |= _variants(chr(av), ignorecase)
+        elif op is sre_constants.IN:
+            for item_op, item_av in av:
+                if item_op is sre_constants.LITERAL:
+                    chars |= _variants(chr(item_av), ignorecase)
+                elif item_op is sre_constants.RANGE and item_av[1] - item_av[0] <= _MAX_RANGE:
+                    for code in range(item_av[0], item_av[1] + 1):
+                        chars |= _variants(chr(code), ignorecase)
+                else:
+                    raise _Unknown(f"character class item {item_op}")
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                _collect(branch, flags, chars, info)
+        elif op is sre_constants.SUBPATTERN:
+            group, add_flags, del_flags, sub = av
+            _collect(sub, (flags | add_flags) & ~del_flags, chars, info)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+                    getattr(sre_constants, "POSSESSIVE_REPEAT", None)):
+            _collect(av[2], flags, chars, info)
+        elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+            _collect(av, flags, chars, info)
+        elif op is sre_constants.GROUPREF:
+            # Repeats text already matched, so no new characters
+            continue
+        elif op is sre_constants.AT:
+            if av in (sre_constants.AT_BOUNDARY, sre_constants.AT_NON_BOUNDARY):
+                info["word_context"] = True
+            elif av is sre_constants.AT_BEGINNING_STRING:
+                continue
+            elif av is sre_constants.AT_BEGINNING and not flags & re.MULTILINE:
+                continue
+            else:
+                raise _Unknown(f"position assertion {av}")
+        else:
+            raise _Unknown(f"pattern construct {op}")
+
+def _template_literal(entry):
+    """Expand the replacement with every group empty, giving its literal text."""
+    pattern = entry.pattern
+    names = {index: name for name, index in pattern.groupindex.items()}
+    groups = "".join(f"(?P<{names[i]}>)" if i in names else "()" for i in range(1, pattern.groups + 1))
+    return re.compile(groups).sub(entry.replacement, "", count=1)
+
+def _plain_literal(parsed):
+    """Return the matched string if the pattern is only case-sensitive literals."""
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+    chars = []
+    for op, av in parsed.data:
+        if op is not sre_constants.LITERAL:
+            return None
+        chars.append(chr(av))
+    return "".join(chars)
+
+@lru_cache(maxsize=FILTER_PREFIX_CACHE_SIZE)
+def _proper_prefixes(text):
+    """All non-empty prefixes of text shorter than text itself."""
+    return tuple(text[:size] for size in range(1, len(text)))
+
+def _overlaps(first, second):
+    """True if one string contains the other or they overlap end to start."""
+    if first in second or second in first:
+        return True
+    return first.endswith(_proper_prefixes(second)) or second.endswith(_proper_prefixes(first))
+
+register_cache("filter_literal_prefixes", _proper_prefixes)
+
+def analyse_filter(entry):
+    """Work out the Footprint of a pipeline FilterEntry."""
+    pattern = entry.pattern
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+        info = {"word_context": False}
+        chars = set()
+        _collect(parsed.data, parsed.state.flags, chars, info)
+        literal = _template_literal(entry)
+    except Exception as e:
+        logger.debug(f"Filter '{pattern.pattern}' is not analysable: {e}")
+        return Footprint(None, None, True, False, 0, 0, None, None, False)
+
+    output_chars = set(literal)
+    if pattern.groups:
+        # Group references copy matched text into the output
+        output_chars |= chars
+    return Footprint(
+        chars=frozenset(chars),
+        output_chars=frozenset(output_chars),
+        word_context=info["word_context"],
+        ascii=bool(pattern.flags & re.ASCII),
+        min_width=parsed.getwidth()[0],
+        min_output=len(literal),
+        literal=_plain_literal(parsed),
+        output_literal=literal if not pattern.groups else None,
+        analysable=True,
+    )
+
+def _word_uniform(chars, ascii):
+    """True if all chars are word characters, or none are."""
+    word = _ASCII_WORD if ascii else _WORD
+    return all(word.match(c) for c in chars) or not any(word.match(c) for c in chars)
+
+def independent(a, b):
+    """Check whether two filter footprints can be applied in either order or together."""
+    for footprint in (a, b):
+        if not footprint.analysable or footprint.min_width < 1 or footprint.min_output < 1:
+            return False
+    if a.literal and b.literal and a.output_literal and b.output_literal:
+        # Two plain string replacements only interact if one string can
+        # overlap another: a match could then be created or destroyed
+        return not (_overlaps(a.literal, b.literal)
+                    or _overlaps(a.literal, b.output_literal)
+                    or _overlaps(b.literal, a.output_literal))
+    touched_a = a.chars | a.output_chars
+    touched_b = b.chars | b.output_chars
+    if a.chars & touched_b or b.chars & touched_a:
+        return False
+    if b.word_context and not _word_uniform(touched_a, b.ascii):
+        return False
+    if a.word_context and not _word_uniform(touched_b, a.ascii):
+        return False
+    return True
+
+def group_filters(entries):
+    """
+    Split filters into groups of mutually independent filters.
+
+    Running the groups in order, with the filters of each group in any order,
+    gives the same result as running the filters in their configured order.
+    """
+    footprints = [analyse_filter(entry) for entry in entries]
+    groups = []  # Lists of (entry, footprint)
+
+    for entry, footprint in zip(entries, footprints):
+        target = None
+        # Move back over later groups while the filter is independent of them
+        for index in range(len(groups) - 1, -1, -1):
+            if not all(independent(footprint, other) for _, other in groups[index]):
+                break
+            target = index
+        if target is None:
+            groups.append([(entry, footprint)])
+        else:
+            groups[target].append((entry, footprint))
+
+    return [tuple(entry for entry, _ in group) for group in groups]
+
+def build_plan(groups, hit_counts=None):
+    """
+    Order the filters inside each group by hit count, most frequent first.
+
+    Args:
+        groups: Result of group_filters()
+        hit_counts: Optional dict of pattern string -> hits
+    """
+    hit_counts = hit_counts or {}
+    return [PlanStep(tuple(sorted(group, key=lambda e: -hit_counts.get(e.pattern.pattern, 0))))
+            for group in groups]
+
+def _apply_step(step, text, hits, counts):
+    """
+    Apply one group of independent filters.
+
+    Members cannot affect each other's matches, so their prefilters are all
+    checked against the group's input and the matching ones run in any order.
+    """
+    folded_text = None
+    candidates = []
+    for entry in step.entries:
+        prefilter = entry.prefilter
+        if prefilter is not None and prefilter.ignorecase and folded_text is None:
+            folded_text = text.casefold()
+        if prefilter_matches(prefilter, text, folded_text):
+            candidates.append(entry)
+    counts[1] += len(step.entries) - len(candidates)
+
+    for entry in candidates:
+        counts[0] += 1
+        try:
+            text, count = entry.pattern.subn(entry.replacement, text)
+        except Exception as e:
+            # Same as applying filters one by one: a broken filter changes nothing
+            logger.error(f"Error applying filter pattern '{entry.pattern.pattern}': {e}")
+            continue
+        if count:
+            hits[entry.pattern.pattern] = hits.get(entry.pattern.pattern, 0) + count
+    return text
+
+class FilterEngine:
+    """Applies a list of filters with a plan that is rebuilt from hit statistics."""
+
+    __slots__ = ("entries", "groups", "plan", "hits", "_check_order", "_applied", "_lock")
+
+    def __init__(self, entries, groups=None):
+        """
+        Args:
+            entries: FilterEntry list in configured order
+            groups: Result of group_filters(entries) if already known
+                (e.g. restored from the pipeline snapshot)
+        """
+        self.entries = list(entries)
+        self.hits = {}
+        self._applied = 0
+        self._lock = threading.Lock()
+        self.groups = groups if groups is not None else group_filters(self.entries)
+        self.plan = build_plan(self.groups)
+        self._check_order = list(self.entries)
+        logger.info(f"Filter plan: {len(self.entries)} filters in {len(self.plan)} groups")
+
+    def prefilter(self, text):
+        """True if any filter could match the text (most frequent hitters checked first)."""
+        folded_text = text.casefold()
+        return any(prefilter_matches(entry.prefilter, text, folded_text) for entry in self._check_order)
+
+    def apply(self, text):
+        """Apply all filters; the result equals applying them one after another."""
+        if not text:
+            return text
+        hits = {}
+        counts = [0, 0]  # Applied, skipped
+        for step in self.plan:
+            new_text = _apply_step(step, text, hits, counts)
+            if new_text != text:
+                logger.info(f"Text changed: '{text}' -> '{new_text}'")
+                text = new_text
+        metrics.increment("filters.applied", counts[0])
+        metrics.increment("filters.skipped", counts[1])
+        self._record(hits)
+        return text
+
+    def _record(self, hits):
+        """Add hit counts and periodically re-plan."""
+        with self._lock:
+            for pattern, count in hits.items():
+                self.hits[pattern] = self.hits.get(pattern, 0) + count
+            self._applied += 1
+            if self._applied % FILTER_REPLAN_INTERVAL == 0:
+                self.plan = build_plan(self.groups, self.hits)
+                self._check_order = sorted(self.entries, key=lambda e: -self.hits.get(e.pattern.pattern, 0))
@@ -2,6 +2,8 @@ import json
 import os
 import re
 import logging
+import status_cache
+import pipeline
 
 logger = logging.getLogger(__name__)
 
@@ -37,11 +39,32 @@ def save_filters(filters_list):
     try:
         with open(FILTERS_FILE, 'w') as f:
             json.dump(filters_data, f, indent=2)
+        status_cache.invalidate()
+        pipeline.invalidate()
         return True
     except Exception as e:
         logger.error(f"Error saving filters: {e}")
         return False
 
+def check_filter(pattern, replacement):
+    """Check that a filter can be applied.
+    
+    Compiles the pattern and the replacement template (which catches bad
+    group references such as \\1 or \\g<name>) without saving anything.
+    
+    Returns:
+        None if the filter is valid, otherwise an error message
+    """
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        return f"Invalid regular expression: {e}"
+    try:
+        compiled.sub(replacement, "")
+    except (re.error, IndexError) as e:
+        return f"Invalid replacement: {e}"
+    return None
+
 def add_filter(pattern, replacement):
     """Add a new filter pattern and replacement."""
     filters = load_filters()
@@ -57,6 +80,24 @@ def add_filter(pattern, replacement):
     filters.append((pattern, replacement))
     return save_filters(filters)
 
+def add_filters(new_filters):
+    """Add or update several filters with a single write.
+    
+    Args:
+        new_filters: List of (pattern, replacement) tuples
+    """
+    filters = load_filters()
+    positions = {pattern: i for i, (pattern, _) in enumerate(filters)}
+    
+    for pattern, replacement in new_filters:
+        if pattern in positions:
+            filters[positions[pattern]] = (pattern, replacement)
+        else:
+            positions[pattern] = len(filters)
+            filters.append((pattern, replacement))
+    
+    return save_filters(filters)
+
 def remove_filter(pattern):
     """Remove a filter by its pattern."""
     filters = load_filters()
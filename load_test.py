@@ -0,0 +1,159 @@
+"""
+Load test against a local fake Bot API server.
+
+Starts fake_bot_api.FakeBotAPI, runs the bot (python main.py bot) in a
+subprocess pointed at it with BOT_API_BASE_URL, and simulates N channels
+posting at a configurable rate. Reports end-to-end latency from a post being
+queued to the bot's edit of it arriving, and edit throughput.
+
+The bot runs in a temporary directory, so its filters, channels and snapshot
+files start empty (only config.TEXT_FILTERS apply and all channels are
+monitored) and the repository's own files are not touched.
+Run with: python load_test.py --help
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+from fake_bot_api import FakeBotAPI
+
+# Post texts that the default filters and timezone conversion change
+EDITED_TEXTS = [
+    "urgent: launch at 10:00",
+    "Important update 14:30",
+    "🚧 maintenance window 01/15/2025 23:00",
+    "Join @Gazew_07 at 09:15 PM",
+]
+# Post texts that need no edit
+UNCHANGED_TEXTS = [
+    "Good morning everyone",
+    "New article is up, link in bio",
+]
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+def wait_for_bot(api, process, timeout):
+    """Wait until the bot has started long polling."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        if api.stats()["calls"].get("getUpdates"):
+            return True
+        time.sleep(0.1)
+    return False
+
+def generate_load(api, args, rng):
+    """Post from every channel at args.rate posts/second (Poisson arrivals) for args.duration seconds."""
+    expected_edits = set()
+    channels = [-1001000000000 - i for i in range(args.channels)]
+    started = time.perf_counter()
+    next_post = {chat_id: started + rng.expovariate(args.rate) for chat_id in channels}
+
+    while True:
+        chat_id, due = min(next_post.items(), key=lambda item: item[1])
+        if due - started >= args.duration:
+            break
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        unchanged = rng.random() < args.unchanged_ratio
+        text = rng.choice(UNCHANGED_TEXTS if unchanged else EDITED_TEXTS)
+        key = api.add_post(chat_id, text, caption=rng.random() < args.caption_ratio)
+        if not unchanged:
+            expected_edits.add(key)
+        next_post[chat_id] = due + rng.expovariate(args.rate)
+    return expected_edits, started
+
+def report(api, expected_edits, started, args):
+    """Print latency percentiles, throughput and API call counts."""
+    latencies = sorted(api.edited_at[key] - api.posted_at[key]
+                       for key in expected_edits if key in api.edited_at)
+    stats = api.stats()
+    print(f"Channels: {args.channels}, rate: {args.rate}/s per channel, duration: {args.duration}s")
+    print(f"Posts: {stats['posts']} ({len(expected_edits)} needing an edit), "
+          f"edited: {len(latencies)}, missing edits: {len(expected_edits) - len(latencies)}")
+
+    if latencies:
+        last_edit = max(api.edited_at[key] for key in expected_edits if key in api.edited_at)
+        throughput = len(latencies) / max(last_edit - started, 1e-9)
+        print(f"Throughput: {throughput:.1f} edits/s")
+        print("Edit latency (ms): " + ", ".join(
+            f"p{int(fraction * 100)} {percentile(latencies, fraction) * 1000:.1f}"
+            for fraction in (0.5, 0.9, 0.95, 0.99)
+        ) + f", max {latencies[-1] * 1000:.1f}")
+
+    print("API calls: " + ", ".join(f"{method} {count}" for method, count in sorted(stats["calls"].items())))
+    if stats["errors"]:
+        print("Injected errors: " + ", ".join(f"{code} {count}" for code, count in sorted(stats["errors"].items())))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channels", type=int, default=10, help="number of simulated channels")
+    parser.add_argument("--rate", type=float, default=1.0, help="posts per second per channel")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to generate posts for")
+    parser.add_argument("--drain", type=float, default=30.0, help="seconds to wait for outstanding edits")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per edit/send call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random seconds per edit/send call")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="share of edit/send calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after seconds sent with 429")
+    parser.add_argument("--permission-error-ratio", type=float, default=0.0,
+                        help="share of edit/send calls answered with a permission error")
+    parser.add_argument("--caption-ratio", type=float, default=0.2, help="share of posts that are captioned photos")
+    parser.add_argument("--unchanged-ratio", type=float, default=0.2, help="share of posts that need no edit")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--bot-log", help="file for the bot's log output (default: in the temporary directory)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    api = FakeBotAPI(
+        latency=args.latency, jitter=args.jitter, rate_limit_ratio=args.rate_limit_ratio,
+        retry_after=args.retry_after, permission_error_ratio=args.permission_error_ratio, seed=args.seed,
+    ).start()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as work_dir:
+        log_path = args.bot_log or os.path.join(work_dir, "bot.log")
+        env = dict(
+            os.environ,
+            TELEGRAM_BOT_TOKEN="0:loadtest",
+            BOT_API_BASE_URL=api.base_url,
+            PYTHONPATH=repo_dir,
+        )
+        env.pop("CHANNEL_ID", None)
+        with open(log_path, "w") as log_file:
+            process = subprocess.Popen([sys.executable, os.path.join(repo_dir, "main.py"), "bot"],
+                                       cwd=work_dir, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+            try:
+                if not wait_for_bot(api, process, timeout=30):
+                    with open(log_path) as f:
+                        print("Bot did not start polling. Last log lines:\n" + "".join(f.readlines()[-20:]))
+                    return 1
+
+                expected_edits, started = generate_load(api, args, rng)
+
+                deadline = time.monotonic() + args.drain
+                while time.monotonic() < deadline and not expected_edits <= api.edited_at.keys():
+                    time.sleep(0.1)
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+        report(api, expected_edits, started, args)
+    api.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,7 @@
+import os
+import sys
 import logging
-from bot import start_bot
+import threading
 
 # Configure logging
 logging.basicConfig(
@@ -9,10 +11,45 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Create a Flask application instance variable in the module
-# This allows gunicorn to access the app variable
-from app import app
+# Each role imports only what it needs: the status page never loads
+# telegram.ext and the bot never loads Flask.
+
+def run_bot():
+    """Run only the Telegram bot."""
+    from bot import start_bot
 
-if __name__ == "__main__":
     logger.info("Starting Telegram channel message editor bot")
     start_bot()
+
+def run_status():
+    """Run only the Flask status page."""
+    from app import app as status_app
+
+    port = int(os.environ.get("PORT", 5000))
+    logger.info(f"Starting status page on port {port}")
+    status_app.run(host="0.0.0.0", port=port)
+
+def run_combined():
+    """Run the status page in a background thread and the bot in the main thread."""
+    threading.Thread(target=run_status, name="status-page", daemon=True).start()
+    run_bot()
+
+ROLES = {
+    "bot": run_bot,
+    "status": run_status,
+    "combined": run_combined,
+}
+
+def __getattr__(name):
+    """Import the Flask app only when it is requested (e.g. gunicorn main:app)."""
+    if name == "app":
+        from app import app as status_app
+        return status_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+if __name__ == "__main__":
+    role = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("BOT_ROLE", "bot")
+    if role not in ROLES:
+        logger.error(f"Unknown role '{role}'. Choose one of: {', '.join(ROLES)}")
+        sys.exit(2)
+    ROLES[role]()
@@ -0,0 +1,84 @@
+import logging
+import tracemalloc
+from caches import cache_stats
+from config import MEMORY_BUDGET_MODE, TRACEMALLOC_FRAMES, MEMSTATS_TOP_ALLOCATORS
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+def start_tracing():
+    """Start tracemalloc if enabled in config (it slows allocation down)."""
+    if TRACEMALLOC_FRAMES > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+        logger.info(f"tracemalloc started with {TRACEMALLOC_FRAMES} frames")
+
+def _rss_kb():
+    """Return (current RSS, peak RSS) in KiB where the platform reports them."""
+    current = None
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            pages = int(f.read().split()[1])
+        current = pages * (resource.getpagesize() if resource else 4096) // 1024
+    except Exception:
+        pass
+
+    peak = None
+    if resource is not None:
+        # ru_maxrss is KiB on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return current, peak
+
+def collect_memstats(top=MEMSTATS_TOP_ALLOCATORS):
+    """
+    Gather memory usage: RSS, sizes of all bounded caches and, when
+    tracemalloc is running, the top allocation sites.
+    """
+    current_rss, peak_rss = _rss_kb()
+    stats = {
+        "memory_budget_mode": MEMORY_BUDGET_MODE,
+        "rss_kb": current_rss,
+        "peak_rss_kb": peak_rss,
+        "caches": cache_stats(),
+        "tracemalloc": None,
+    }
+
+    if tracemalloc.is_tracing():
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        stats["tracemalloc"] = {
+            "current_kb": traced_current // 1024,
+            "peak_kb": traced_peak // 1024,
+            "top": [
+                {"location": str(stat.traceback[0]), "size_kb": round(stat.size / 1024, 1), "count": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]
+            ],
+        }
+    return stats
+
+def format_memstats(stats):
+    """Format collected memory stats as a plain-text report."""
+    lines = [
+        f"Memory budget mode: {'on' if stats['memory_budget_mode'] else 'off'}",
+        f"RSS: {stats['rss_kb']} KiB (peak {stats['peak_rss_kb']} KiB)",
+        "",
+        "Caches:",
+    ]
+    for name, cache in stats["caches"].items():
+        lines.append(f"- {name}: {cache['size']}/{cache['maxsize']} "
+                     f"(hits {cache['hits']}, misses {cache['misses']})")
+
+    traced = stats["tracemalloc"]
+    if traced is None:
+        lines += ["", "tracemalloc is off (set TRACEMALLOC_FRAMES to enable it)."]
+    else:
+        lines += ["", f"Traced: {traced['current_kb']} KiB (peak {traced['peak_kb']} KiB)", "Top allocators:"]
+        for entry in traced["top"]:
+            lines.append(f"- {entry['location']}: {entry['size_kb']} KiB in {entry['count']} blocks")
+    return "\n".join(lines)
@@ -0,0 +1,56 @@
+import threading
+import time
+
+# Process-wide counters and timing aggregates.
+# Only running totals are kept, so memory use stays constant no matter how
+# long the bot runs.
+_lock = threading.Lock()
+_counters = {}
+_timings = {}
+_started_at = time.time()
+
+def increment(name, amount=1):
+    """Increase a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def record_timing(name, seconds):
+    """Record one duration (in seconds) under the given name."""
+    with _lock:
+        stats = _timings.get(name)
+        if stats is None:
+            _timings[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+def get_counter(name):
+    """Return the current value of a counter (0 if never incremented)."""
+    with _lock:
+        return _counters.get(name, 0)
+
+def snapshot():
+    """Return a JSON-serializable copy of all metrics."""
+    with _lock:
+        timings = {
+            name: {
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "avg_ms": round(total * 1000 / count, 3) if count else 0.0,
+                "max_ms": round(maximum * 1000, 3),
+            }
+            for name, (count, total, maximum) in _timings.items()
+        }
+        return {
+            "uptime_seconds": round(time.time() - _started_at, 1),
+            "counters": dict(_counters),
+            "timings": timings,
+        }
+
+def reset():
+    """Clear all collected metrics."""
+    with _lock:
+        _counters.clear()
+        _timings.clear()
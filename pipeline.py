@@ -0,0 +1,311 @@
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from config import (
+    TEXT_FILTERS,
+    PIPELINE_SNAPSHOT_FILE,
+    USE_PIPELINE_SNAPSHOT,
+    PIPELINE_RELOAD_INTERVAL,
+    ADAPTIVE_FILTER_ORDERING,
+)
+
+logger = logging.getLogger(__name__)
+
+# One compiled filter. A namedtuple has no per-instance __dict__, so it costs
+# no more memory than a plain tuple.
+FilterEntry = namedtuple("FilterEntry", ["pattern", "replacement", "prefilter"])
+
+# Precompiled processing state: validated, compiled filters and normalised
+# channel lookups. Built once and reused for every post instead of re-reading
+# and re-compiling the JSON files per message. Saving filters or channels
+# calls invalidate(); edits made to the files by hand are picked up by a
+# throttled mtime check.
+#
+# Reading the current pipeline takes no lock. Rebuilds hold _build_lock and
+# swap the finished pipeline in with a single assignment. The event loop never
+# waits for that lock and never builds itself once a pipeline exists: it hands
+# the rebuild to a background thread, and posts keep using the current
+# pipeline until the new one is ready. invalidate() bumps _generation, so a
+# change saved while a build is running is not lost.
+_build_lock = threading.Lock()
+_pipeline = None
+_generation = 0
+_built_generation = None
+_source_key = None
+_last_check = 0.0
+
+def invalidate():
+    """Mark the pipeline as stale so the next post rebuilds it."""
+    global _generation
+    _generation += 1
+
+def source_mtimes():
+    """Return modification times of the filters and channels files."""
+    from filter_manager import FILTERS_FILE
+    from channel_manager import CHANNELS_FILE
+
+    mtimes = []
+    for path in (FILTERS_FILE, CHANNELS_FILE):
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+# Bump when the snapshot layout or the filter analysis changes
+_SNAPSHOT_VERSION = 2
+
+def _compute_source_key(mtimes):
+    """Identify the inputs a pipeline was built from (files, static config and analysis version)."""
+    # The regex parser the analysis relies on may differ between Python versions
+    material = json.dumps([_SNAPSHOT_VERSION, list(sys.version_info[:2]), ADAPTIVE_FILTER_ORDERING,
+                           list(mtimes), [list(f) for f in TEXT_FILTERS]])
+    return hashlib.sha1(material.encode("utf-8")).hexdigest()
+
+def normalize_channels(channels):
+    """
+    Split monitored channels into lowercase usernames (without @) and numeric IDs.
+
+    Returns:
+        Tuple of (usernames frozenset, chat IDs frozenset)
+    """
+    usernames = set()
+    chat_ids = set()
+    for channel in channels:
+        channel = str(channel).strip()
+        if channel.startswith('@'):
+            usernames.add(channel[1:].lower())
+        elif channel:
+            chat_ids.add(channel)
+    return frozenset(usernames), frozenset(chat_ids)
+
+def validate_filters(filters_list):
+    """Return only the filters whose pattern compiles, logging the rest."""
+    valid = []
+    for pattern, replacement in filters_list:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            logger.error(f"Skipping invalid filter pattern '{pattern}': {e}")
+            continue
+        valid.append((pattern, replacement))
+    return valid
+
+def _assemble(filters_list, channels, analysis=None):
+    """
+    Create the in-memory pipeline from already validated inputs.
+
+    Args:
+        analysis: Filter analysis restored from a snapshot (prefilters and
+            filter engine groups), so it does not have to be recomputed
+    """
+    from stages import build_stages, literal_prefilter, LiteralPrefilter
+
+    usernames, chat_ids = normalize_channels(channels)
+    compiled_filters = []
+    for index, (pattern, replacement) in enumerate(filters_list):
+        compiled = re.compile(pattern)
+        if analysis is not None:
+            saved = analysis["prefilters"][index]
+            prefilter = LiteralPrefilter(*saved) if saved is not None else None
+        else:
+            prefilter = literal_prefilter(compiled)
+        compiled_filters.append(FilterEntry(compiled, replacement, prefilter))
+
+    assembled = {
+        "filters": filters_list,
+        "compiled_filters": compiled_filters,
+        "channels": tuple(channels),
+        "channel_usernames": usernames,
+        "channel_ids": chat_ids,
+    }
+    if ADAPTIVE_FILTER_ORDERING:
+        from filter_engine import FilterEngine
+        groups = None
+        if analysis is not None and analysis.get("groups") is not None:
+            groups = [tuple(compiled_filters[i] for i in group) for group in analysis["groups"]]
+        assembled["filter_engine"] = FilterEngine(compiled_filters, groups)
+    assembled["stages"] = build_stages(assembled)
+    return assembled
+
+def _build():
+    """Read filters and channels from disk and build a fresh pipeline."""
+    from filter_manager import get_all_filters
+    from channel_manager import load_channels
+
+    return _assemble(validate_filters(get_all_filters()), load_channels())
+
+def _analysis(pipeline):
+    """Extract the filter analysis (prefilters, engine groups) in JSON form."""
+    prefilters = [list(entry.prefilter) if entry.prefilter is not None else None
+                  for entry in pipeline["compiled_filters"]]
+    groups = None
+    engine = pipeline.get("filter_engine")
+    if engine is not None:
+        positions = {id(entry): index for index, entry in enumerate(pipeline["compiled_filters"])}
+        groups = [[positions[id(entry)] for entry in group] for group in engine.groups]
+    return {"prefilters": prefilters, "groups": groups}
+
+def save_snapshot(pipeline, source_key):
+    """
+    Write the validated pipeline inputs and their analysis to PIPELINE_SNAPSHOT_FILE.
+
+    Compiling the patterns again on load is cheap; finding prefilters and
+    grouping independent filters is most of the build time, so it is saved.
+    """
+    data = {
+        "source_key": source_key,
+        "filters": [[pattern, replacement] for pattern, replacement in pipeline["filters"]],
+        "channels": list(pipeline["channels"]),
+        "analysis": _analysis(pipeline),
+    }
+    try:
+        with open(PIPELINE_SNAPSHOT_FILE, 'w') as f:
+            json.dump(data, f)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving pipeline snapshot: {e}")
+        return False
+
+def load_snapshot():
+    """
+    Load the pipeline from PIPELINE_SNAPSHOT_FILE if it matches the current sources.
+
+    Returns True when the snapshot was used, False if it was missing or stale.
+    """
+    global _pipeline, _built_generation, _source_key, _last_check
+
+    mtimes = source_mtimes()
+    key = _compute_source_key(mtimes)
+    try:
+        with open(PIPELINE_SNAPSHOT_FILE, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable pipeline snapshot: {e}")
+        return False
+
+    if data.get("source_key") != key:
+        logger.info("Pipeline snapshot is stale; rebuilding from source files")
+        return False
+
+    try:
+        restored = _assemble([tuple(item) for item in data["filters"]], data["channels"], data["analysis"])
+    except Exception as e:
+        logger.warning(f"Ignoring invalid pipeline snapshot: {e}")
+        return False
+
+    with _build_lock:
+        _pipeline = restored
+        _source_key = key
+        _built_generation = _generation
+        _last_check = time.monotonic()
+    logger.info(f"Loaded pipeline snapshot with {len(_pipeline['filters'])} filters "
+                f"and {len(_pipeline['channels'])} channels")
+    return True
+
+def _rebuild():
+    """Build a fresh pipeline and swap it in. The caller holds _build_lock."""
+    global _pipeline, _built_generation, _source_key, _last_check
+
+    generation = _generation
+    try:
+        built = _build()
+    except Exception as e:
+        if _pipeline is None:
+            raise
+        # Keep serving the working pipeline until the sources change again
+        logger.error(f"Pipeline rebuild failed, keeping the previous pipeline: {e}")
+        _built_generation = generation
+        _source_key = _compute_source_key(source_mtimes())
+        return _pipeline
+    # Building can create missing files, so take the key afterwards
+    key = _compute_source_key(source_mtimes())
+    _pipeline = built
+    _source_key = key
+    _built_generation = generation
+    _last_check = time.monotonic()
+    if USE_PIPELINE_SNAPSHOT:
+        save_snapshot(built, key)
+    return built
+
+def _on_event_loop():
+    """True if called from a thread that is running an asyncio event loop."""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def _rebuild_in_background():
+    """Rebuild in a daemon thread. The caller holds _build_lock; the thread releases it."""
+    def run():
+        try:
+            if _built_generation != _generation:
+                _rebuild()
+        except Exception as e:
+            logger.error(f"Pipeline rebuild failed: {e}")
+        finally:
+            _build_lock.release()
+
+    threading.Thread(target=run, name="pipeline-rebuild", daemon=True).start()
+
+def get_pipeline():
+    """Return the current pipeline, rebuilding it if its sources changed."""
+    global _last_check
+
+    current = _pipeline
+    if current is not None and _built_generation == _generation:
+        now = time.monotonic()
+        if now - _last_check < PIPELINE_RELOAD_INTERVAL:
+            return current
+        _last_check = now
+        if _compute_source_key(source_mtimes()) == _source_key:
+            return current
+        invalidate()
+
+    # Only wait for a running rebuild when there is no pipeline to use yet
+    if not _build_lock.acquire(blocking=current is None):
+        return current
+    if current is not None and _on_event_loop():
+        # Reading the files and analysing the filters can take hundreds of
+        # milliseconds, so keep the event loop free for posts
+        _rebuild_in_background()
+        return current
+    try:
+        if _pipeline is not None and _built_generation == _generation:
+            # Another thread finished a rebuild meanwhile
+            return _pipeline
+        return _rebuild()
+    finally:
+        _build_lock.release()
+
+def apply_change(func, *args):
+    """
+    Run func (which saves filters or channels) and rebuild the pipeline.
+
+    Both happen under the build lock, so posts processed meanwhile keep using
+    the previous pipeline instead of rebuilding it themselves. Meant to be
+    run in a worker thread.
+    """
+    with _build_lock:
+        result = func(*args)
+        _rebuild()
+    return result
+
+def is_monitored_channel(chat_id, username):
+    """Check whether a chat is monitored (all chats are when no channels are configured)."""
+    current = get_pipeline()
+    if not current["channels"]:
+        return True
+    if chat_id is not None and str(chat_id) in current["channel_ids"]:
+        return True
+    return bool(username) and username.lower() in current["channel_usernames"]
@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import logging
+from telegram import Update
+from telegram.error import RetryAfter, TelegramError
+import metrics
+import command_lane
+from config import POLLING_TIMEOUT, SHUTDOWN_DRAIN_TIMEOUT, PENDING_UPDATES_FILE
+
+logger = logging.getLogger(__name__)
+
+# Polling loop with at-least-once processing.
+#
+# Unlike Application.run_polling(), which confirms updates to Telegram as soon
+# as they are fetched, the offset here only moves past a batch once every
+# update in it has been processed or written to PENDING_UPDATES_FILE. On
+# SIGTERM/SIGINT intake stops immediately, the current batch gets up to
+# SHUTDOWN_DRAIN_TIMEOUT seconds to finish, and whatever is left is persisted
+# and processed first on the next start. Management commands queued on the
+# command lane (already confirmed to Telegram) get the rest of the deadline
+# and are persisted the same way if they have not finished.
+
+def load_pending_updates():
+    """Load updates persisted by a previous shutdown (as raw dicts)."""
+    if not os.path.exists(PENDING_UPDATES_FILE):
+        return []
+
+    try:
+        with open(PENDING_UPDATES_FILE, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading pending updates: {e}")
+        return []
+
+def save_pending_updates(updates_data):
+    """Persist unprocessed updates (as raw dicts) so the next start can resume them."""
+    try:
+        with open(PENDING_UPDATES_FILE, 'w') as f:
+            json.dump(updates_data, f)
+        return True
+    except Exception as e:
+        logger.error(f"Error saving pending updates: {e}")
+        return False
+
+def clear_pending_updates():
+    """Remove the pending updates file once its contents have been processed."""
+    try:
+        os.remove(PENDING_UPDATES_FILE)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Error removing pending updates file: {e}")
+
+async def _process_batch(application, updates, remaining):
+    """Process updates in order, removing each from remaining once it is done."""
+    for update in updates:
+        await application.process_update(update)
+        remaining.pop(0)
+        metrics.increment("updates.processed")
+
+async def _commit_offset(bot, offset):
+    """Confirm all updates below offset to Telegram without long polling."""
+    try:
+        await bot.get_updates(offset=offset, timeout=0, limit=1)
+        return True
+    except TelegramError as e:
+        logger.error(f"Could not commit update offset {offset}: {e}")
+        return False
+
+def _install_signal_handlers(stop_event):
+    """Set stop_event on SIGTERM/SIGINT."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Not supported on this platform (e.g. Windows); Ctrl+C still
+            # raises KeyboardInterrupt.
+            logger.warning(f"Could not install handler for signal {sig}")
+
+async def run_polling(application, allowed_updates=None):
+    """Run the bot until a stop signal, draining or persisting in-flight work."""
+    bot = application.bot
+    stop_event = asyncio.Event()
+    _install_signal_handlers(stop_event)
+
+    await application.initialize()
+    await application.start()
+
+    offset = None
+    current_batch = []
+    batch_end_offset = None
+    processing_task = None
+    stop_task = asyncio.create_task(stop_event.wait())
+
+    try:
+        # Resume work persisted by the previous shutdown before taking new updates
+        pending = load_pending_updates()
+        if pending:
+            logger.info(f"Resuming {len(pending)} updates persisted at last shutdown")
+            metrics.increment("updates.resumed", len(pending))
+            current_batch = [Update.de_json(data, bot) for data in pending]
+            batch_end_offset = None
+            processing_task = asyncio.create_task(
+                _process_batch(application, list(current_batch), current_batch))
+            await asyncio.wait({processing_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+            if processing_task.done():
+                processing_task.result()
+                processing_task = None
+                clear_pending_updates()
+
+        while not stop_event.is_set():
+            fetch_task = asyncio.create_task(bot.get_updates(
+                offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=allowed_updates))
+            await asyncio.wait({fetch_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+
+            if not fetch_task.done():
+                # Stop intake; the offset has not moved, so nothing is lost
+                fetch_task.cancel()
+                break
+
+            try:
+                updates = fetch_task.result()
+            except RetryAfter as e:
+                logger.warning(f"Flood control on getUpdates, retrying in {e.retry_after}s")
+                await asyncio.wait({stop_task}, timeout=float(e.retry_after))
+                continue
+            except Exception as e:
+                logger.error(f"Error while polling for updates: {e}")
+                await asyncio.wait({stop_task}, timeout=1.0)
+                continue
+
+            if not updates:
+                continue
+
+            metrics.increment("updates.fetched", len(updates))
+            current_batch = list(updates)
+            batch_end_offset = updates[-1].update_id + 1
+            processing_task = asyncio.create_task(
+                _process_batch(application, list(updates), current_batch))
+            await asyncio.wait({processing_task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+            if not processing_task.done():
+                break
+
+            processing_task.result()
+            processing_task = None
+            # The whole batch is processed; the next getUpdates call confirms it
+            offset = batch_end_offset
+    finally:
+        stop_task.cancel()
+        deadline = time.monotonic() + SHUTDOWN_DRAIN_TIMEOUT
+
+        if processing_task is not None and not processing_task.done():
+            logger.info(f"Stopping: waiting up to {SHUTDOWN_DRAIN_TIMEOUT}s "
+                        f"for {len(current_batch)} in-flight updates")
+            done, _ = await asyncio.wait({processing_task}, timeout=SHUTDOWN_DRAIN_TIMEOUT)
+            if not done:
+                processing_task.cancel()
+                await asyncio.gather(processing_task, return_exceptions=True)
+
+        # Posts first, then queued commands with whatever time is left
+        unfinished_commands = await command_lane.drain(deadline - time.monotonic())
+        unfinished_posts = current_batch if processing_task is not None else []
+
+        if unfinished_commands or unfinished_posts:
+            # Deadline passed: keep the rest for the next start. Commands
+            # were queued earlier than the batch, so they go first.
+            unprocessed = unfinished_commands + unfinished_posts
+            logger.warning(f"Persisting {len(unprocessed)} unprocessed updates "
+                           f"to {PENDING_UPDATES_FILE}")
+            metrics.increment("updates.persisted", len(unprocessed))
+            if not save_pending_updates([update.to_dict() for update in unprocessed]):
+                # Leave the batch unconfirmed so Telegram delivers it again
+                batch_end_offset = None
+        elif processing_task is not None:
+            clear_pending_updates()
+
+        if processing_task is not None and batch_end_offset is not None:
+            offset = batch_end_offset
+
+        if offset is not None:
+            await _commit_offset(bot, offset)
+
+        await application.stop()
+        await application.shutdown()
+        logger.info("Bot stopped")
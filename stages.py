@@ -0,0 +1,202 @@
+import re
+import logging
+import importlib
+from collections import namedtuple
+import metrics
+from config import PIPELINE_STAGES, TIMEZONE_PREFILTER
+
+try:
+    from re import _parser as sre_parse
+    from re._constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT, AT
+except ImportError:  # Python < 3.11
+    import sre_parse
+    from sre_constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT, AT
+
+logger = logging.getLogger(__name__)
+
+# A processing stage. prefilter(text) is a cheap check that must return True
+# for every text the stage could change; when it returns False the stage is
+# skipped. run(text, reference_time) returns the processed text; reference_time
+# is the post's date (or None).
+Stage = namedtuple("Stage", ["name", "prefilter", "run"])
+
+# Literal prefilter for a single regex: the pattern can only match text that
+# contains `literal` (compared case-insensitively when `ignorecase` is set).
+LiteralPrefilter = namedtuple("LiteralPrefilter", ["literal", "ignorecase"])
+
+def _is_safe_ignorecase_char(char):
+    """
+    Check that a literal character can be matched case-insensitively via casefold().
+
+    Only ASCII is used. 'i' is excluded because re also matches it against the
+    dotted and dotless Turkish i, which casefold differently.
+    """
+    return char.isascii() and char not in "iI"
+
+def _literal_runs(items, ignorecase, runs, current):
+    """Collect runs of consecutive literal characters every match must contain."""
+    for op, av in items:
+        if op is LITERAL:
+            char = chr(av)
+            if ignorecase and not _is_safe_ignorecase_char(char):
+                runs.append("".join(current))
+                current.clear()
+            else:
+                current.append(char)
+        elif op is AT:
+            # Zero-width assertions such as \b do not consume characters
+            continue
+        elif op is SUBPATTERN and not av[1] and not av[2]:
+            # Plain group without local flag changes
+            _literal_runs(av[3], ignorecase, runs, current)
+        elif op in (MAX_REPEAT, MIN_REPEAT) and av[0] >= 1:
+            # Repeated at least once: its literals are required, but not
+            # contiguous with the surrounding ones
+            runs.append("".join(current))
+            current.clear()
+            _literal_runs(av[2], ignorecase, runs, current)
+            runs.append("".join(current))
+            current.clear()
+        else:
+            runs.append("".join(current))
+            current.clear()
+
+def literal_prefilter(pattern):
+    """
+    Work out the longest literal substring every match of a pattern contains.
+
+    Args:
+        pattern: A compiled regular expression
+
+    Returns:
+        LiteralPrefilter, or None if no required literal could be determined
+    """
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except Exception as e:
+        logger.debug(f"Could not analyse pattern '{pattern.pattern}': {e}")
+        return None
+
+    ignorecase = bool(parsed.state.flags & re.IGNORECASE)
+    runs = []
+    current = []
+    _literal_runs(parsed.data, ignorecase, runs, current)
+    runs.append("".join(current))
+
+    literal = max(runs, key=len)
+    if not literal:
+        return None
+    if ignorecase:
+        literal = literal.casefold()
+    return LiteralPrefilter(literal, ignorecase)
+
+def prefilter_matches(prefilter, text, folded_text=None):
+    """Check a LiteralPrefilter against text (folded_text is text.casefold())."""
+    if prefilter is None:
+        return True
+    if prefilter.ignorecase:
+        if folded_text is None:
+            folded_text = text.casefold()
+        return prefilter.literal in folded_text
+    return prefilter.literal in text
+
+def build_text_filters_stage(current_pipeline):
+    """Stage applying all text filters; runs if any filter's prefilter matches."""
+    from utils import apply_text_filters
+
+    compiled_filters = current_pipeline["compiled_filters"]
+    engine = current_pipeline.get("filter_engine")
+    if engine is not None:
+        return Stage("text_filters", engine.prefilter,
+                     lambda text, reference_time: engine.apply(text))
+
+    def prefilter(text):
+        folded_text = None
+        for _, _, filter_prefilter in compiled_filters:
+            if filter_prefilter is not None and filter_prefilter.ignorecase and folded_text is None:
+                folded_text = text.casefold()
+            if prefilter_matches(filter_prefilter, text, folded_text):
+                return True
+        return False
+
+    return Stage("text_filters", prefilter,
+                 lambda text, reference_time: apply_text_filters(text, compiled_filters))
+
+def build_timezone_stage(current_pipeline):
+    """Stage converting timestamps; runs only on text that looks like it has a date or time."""
+    from utils import convert_timezone
+
+    pattern = re.compile(TIMEZONE_PREFILTER)
+    return Stage("timezone_conversion", lambda text: pattern.search(text) is not None, convert_timezone)
+
+# Built-in stages that can be listed by name in config.PIPELINE_STAGES
+STAGE_BUILDERS = {
+    "text_filters": build_text_filters_stage,
+    "timezone_conversion": build_timezone_stage,
+}
+
+def _resolve_builder(name):
+    """Find a stage builder by built-in name or 'module:function' path."""
+    if name in STAGE_BUILDERS:
+        return STAGE_BUILDERS[name]
+    if ":" in name:
+        module_name, attr = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), attr)
+    raise ValueError(f"Unknown pipeline stage '{name}'")
+
+def build_stages(current_pipeline, names=None):
+    """
+    Build the configured list of stages.
+
+    Args:
+        current_pipeline: Pipeline dict the stages read their inputs from
+        names: Stage names, defaults to config.PIPELINE_STAGES. Each is either a
+            built-in stage name or 'module:function', where the function takes
+            the pipeline dict and returns a Stage.
+
+    Raises:
+        Whatever error an unknown or failing stage raises, so a
+        misconfigured stage stops startup instead of being left out
+    """
+    stages = []
+    for name in names if names is not None else PIPELINE_STAGES:
+        try:
+            stages.append(_resolve_builder(name)(current_pipeline))
+        except Exception as e:
+            logger.error(f"Error building pipeline stage '{name}': {e}")
+            raise
+    return stages
+
+def run_stages(text, stages, reference_time=None):
+    """Run text through each stage whose prefilter matches."""
+    for stage in stages:
+        if not stage.prefilter(text):
+            metrics.increment(f"stage.{stage.name}.skipped")
+            logger.debug(f"Skipping stage {stage.name}: prefilter did not match")
+            continue
+        metrics.increment(f"stage.{stage.name}.run")
+        text = stage.run(text, reference_time)
+    return text
+
+def skip_rates(stages=None):
+    """
+    Return how often each stage was run and skipped.
+
+    Args:
+        stages: Stages to report, defaults to those of the current pipeline
+    """
+    if stages is None:
+        from pipeline import get_pipeline
+        stages = get_pipeline()["stages"]
+
+    rates = {}
+    for name in (stage.name for stage in stages):
+        run = metrics.get_counter(f"stage.{name}.run")
+        skipped = metrics.get_counter(f"stage.{name}.skipped")
+        total = run + skipped
+        rates[name] = {
+            "run": run,
+            "skipped": skipped,
+            "skip_rate": round(skipped / total, 4) if total else 0.0,
+        }
+    return rates
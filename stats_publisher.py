@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import logging
+import threading
+import metrics
+from config import BOT_STATS_FILE, BOT_STATS_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# The status page may run in a different process than the bot (the status
+# role or gunicorn), where the bot's counters and caches do not exist. The
+# bot therefore writes its metrics and memory stats to BOT_STATS_FILE every
+# BOT_STATS_INTERVAL seconds, and /api/metrics and /api/memstats serve that
+# file. This also keeps the costly tracemalloc snapshot off the HTTP route.
+
+def collect():
+    """Gather the bot process's metrics and memory stats."""
+    from stages import skip_rates
+    from memstats import collect_memstats
+
+    data = metrics.snapshot()
+    data["stage_skip_rates"] = skip_rates()
+    return {
+        "published_at": time.time(),
+        "pid": os.getpid(),
+        "metrics": data,
+        "memstats": collect_memstats(),
+    }
+
+def publish():
+    """Write the current stats to BOT_STATS_FILE (atomically, via a temporary file)."""
+    temp_path = f"{BOT_STATS_FILE}.tmp"
+    try:
+        with open(temp_path, 'w') as f:
+            json.dump(collect(), f)
+        os.replace(temp_path, BOT_STATS_FILE)
+        return True
+    except Exception as e:
+        logger.error(f"Error publishing bot stats: {e}")
+        return False
+
+def _run():
+    while True:
+        publish()
+        time.sleep(BOT_STATS_INTERVAL)
+
+def start():
+    """Publish stats from a background thread for the life of the process."""
+    threading.Thread(target=_run, name="stats-publisher", daemon=True).start()
+
+def load_published():
+    """
+    Read the stats last published by the bot.
+
+    Returns:
+        The published dict with an added "age_seconds", or None if the bot
+        has not published any
+    """
+    try:
+        with open(BOT_STATS_FILE, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error reading published bot stats: {e}")
+        return None
+    data["age_seconds"] = round(time.time() - data.get("published_at", 0), 1)
+    return data
@@ -0,0 +1,99 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from config import SOURCE_TIMEZONE, TARGET_TIMEZONE, STATUS_CACHE_TTL
+from pipeline import source_mtimes
+
+logger = logging.getLogger(__name__)
+
+# Cached status snapshot shared by the status page and /api/status.
+# It is rebuilt only when invalidate() is called (filters or channels saved in
+# this process) or when one of the JSON files changes on disk, which is checked
+# at most once every STATUS_CACHE_TTL seconds.
+_lock = threading.Lock()
+_snapshot = None
+_dirty = True
+_file_mtimes = None
+_last_check = 0.0
+
+def invalidate():
+    """Mark the snapshot as stale so the next request rebuilds it."""
+    global _dirty
+    _dirty = True
+
+def _build_snapshot():
+    """Read filters and channels once and precompute every status view."""
+    from filter_manager import load_filters
+    from channel_manager import load_channels
+
+    filters_list = [{"pattern": pattern, "replacement": replacement}
+                    for pattern, replacement in load_filters()]
+    channels_list = list(load_channels())
+
+    data = {
+        "status": "online",
+        "channels": channels_list,
+        "channels_count": len(channels_list),
+        "filters": filters_list,
+        "filters_count": len(filters_list),
+        "source_timezone": SOURCE_TIMEZONE,
+        "target_timezone": TARGET_TIMEZONE,
+    }
+    etag = hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # Plain-text views used by the HTML page
+    if channels_list:
+        channels_text = "Monitored channels:\n\n" + "".join(
+            f"{i}. {channel}\n" for i, channel in enumerate(channels_list, 1))
+    else:
+        channels_text = "No channels are being monitored."
+
+    if filters_list:
+        filters_text = "Current text filters:\n\n" + "".join(
+            f"{i}. Pattern: {item['pattern']}\n   Replacement: {item['replacement']}\n\n"
+            for i, item in enumerate(filters_list, 1))
+    else:
+        filters_text = "No custom filters defined."
+
+    return {
+        "data": data,
+        "etag": etag,
+        "channels_text": channels_text,
+        "filters_text": filters_text,
+    }
+
+def get_snapshot():
+    """
+    Return the current status snapshot.
+
+    The returned dict has the keys ``data`` (JSON payload), ``etag``,
+    ``version``, ``channels_text`` and ``filters_text``. ``version`` is a
+    short form of the ETag, so every worker process reports the same version
+    for the same content. Callers must not modify it.
+    """
+    global _snapshot, _dirty, _file_mtimes, _last_check
+
+    with _lock:
+        now = time.monotonic()
+        if not _dirty and now - _last_check >= STATUS_CACHE_TTL:
+            _last_check = now
+            if source_mtimes() != _file_mtimes:
+                _dirty = True
+
+        if _snapshot is None or _dirty:
+            _dirty = False
+            _last_check = now
+            _file_mtimes = source_mtimes()
+            snapshot = _build_snapshot()
+            # Derived from the content rather than counted, so it matches
+            # the ETag in every worker process
+            version = snapshot["etag"][:12]
+            if _snapshot is None or version != _snapshot["version"]:
+                logger.info(f"Status snapshot rebuilt (version {version})")
+            snapshot["version"] = version
+            snapshot["data"]["version"] = version
+            _snapshot = snapshot
+
+        return _snapshot
@@ -0,0 +1,92 @@
+import bisect
+import logging
+from functools import lru_cache
+from datetime import datetime, time, timedelta
+import pytz
+from config import TIMEZONE_TABLE_CACHE_SIZE
+from caches import register_cache
+
+logger = logging.getLogger(__name__)
+
+# Offset tables for converting time-only wall-clock times between two
+# timezones. (Timestamps with a date are converted directly, see utils.)
+#
+# For one (source timezone, target timezone, source-local day) the difference
+# between target and source wall-clock time is piecewise constant: it only
+# changes at DST transitions. The table stores the minute of the day at which
+# each piece starts and its offset, so converting a time is a binary search
+# plus one addition instead of a pytz localize/astimezone round trip.
+
+# Sampling step (minutes) used to locate offset changes within a day.
+# Transitions are then pinned down to the minute by bisection.
+_SAMPLE_STEP = 15
+_MINUTES_PER_DAY = 24 * 60
+
+def _offset_at(source_tz, target_tz, day, minute):
+    """Target minus source wall-clock time for a source-local minute of a day."""
+    local = datetime.combine(day, time()) + timedelta(minutes=minute)
+    converted = source_tz.localize(local).astimezone(target_tz).replace(tzinfo=None)
+    return converted - local
+
+@lru_cache(maxsize=TIMEZONE_TABLE_CACHE_SIZE)
+def offset_table(source_name, target_name, day):
+    """
+    Build the offset table for one source-local day.
+
+    Returns:
+        Tuple of (start minutes, offsets): offsets[i] applies from minute
+        starts[i] of the day until the next start
+    """
+    source_tz = pytz.timezone(source_name)
+    target_tz = pytz.timezone(target_name)
+
+    samples = list(range(0, _MINUTES_PER_DAY, _SAMPLE_STEP)) + [_MINUTES_PER_DAY - 1]
+    starts = [0]
+    offsets = [_offset_at(source_tz, target_tz, day, 0)]
+    previous = 0
+    for minute in samples[1:]:
+        offset = _offset_at(source_tz, target_tz, day, minute)
+        if offset != offsets[-1]:
+            # Find the first minute after `previous` with the new offset
+            lo, hi = previous, minute
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                if _offset_at(source_tz, target_tz, day, mid) == offsets[-1]:
+                    lo = mid
+                else:
+                    hi = mid
+            starts.append(hi)
+            offsets.append(offset)
+        previous = minute
+
+    if len(starts) > 1:
+        logger.info(f"Offset table for {source_name} -> {target_name} on {day} has {len(starts)} segments")
+    return tuple(starts), tuple(offsets)
+
+register_cache("timezone_offset_tables", offset_table)
+
+def convert_wall_time(source_name, target_name, local_dt):
+    """
+    Convert a naive source-local datetime to naive target-local time.
+
+    Ambiguous and non-existent local times follow pytz's localize() defaults.
+    """
+    starts, offsets = offset_table(source_name, target_name, local_dt.date())
+    minute = local_dt.hour * 60 + local_dt.minute
+    return local_dt + offsets[bisect.bisect_right(starts, minute) - 1]
+
+def reference_day(source_name, reference_time=None):
+    """
+    Return the date in the source timezone that time-only timestamps refer to.
+
+    Args:
+        source_name: Source timezone name
+        reference_time: Timezone-aware datetime the text belongs to (usually the
+            post's date). Defaults to now.
+    """
+    source_tz = pytz.timezone(source_name)
+    if reference_time is None:
+        return datetime.now(source_tz).date()
+    if reference_time.tzinfo is None:
+        reference_time = pytz.utc.localize(reference_time)
+    return reference_time.astimezone(source_tz).date()
@@ -1,43 +1,132 @@
 import re
 import logging
-import pytz
+from functools import lru_cache
 from datetime import datetime
-from config import SOURCE_TIMEZONE, TARGET_TIMEZONE, TIME_PATTERN, ADDITIONAL_TIME_PATTERNS
-from filter_manager import get_all_filters
+import pytz
+from config import (
+    SOURCE_TIMEZONE,
+    TARGET_TIMEZONE,
+    TIME_PATTERN,
+    ADDITIONAL_TIME_PATTERNS,
+    SHOW_DAY_ROLLOVER,
+    DAY_ROLLOVER_FORMAT,
+    TIMESTAMP_PARSE_CACHE_SIZE,
+)
+from timezone_tables import convert_wall_time, reference_day
+from caches import register_cache
+from pipeline import get_pipeline
+from stages import prefilter_matches, run_stages
+import metrics
 
 logger = logging.getLogger(__name__)
 
-def apply_text_filters(text):
+def apply_text_filters(text, compiled_filters=None):
     """Apply text filters to the message text"""
     if not text:
         return text
     
-    # Get all filters (both static and dynamic)
-    all_filters = get_all_filters()
+    # Get all filters (both static and dynamic), already validated and compiled
+    all_filters = compiled_filters if compiled_filters is not None else get_pipeline()["compiled_filters"]
     logger.info(f"Got {len(all_filters)} filters to apply")
     
     modified_text = text
+    folded_text = None
     logger.info(f"Original text: {text}")
     
-    for pattern, replacement in all_filters:
-        logger.info(f"Applying filter: pattern='{pattern}', replacement='{replacement}'")
+    for pattern, replacement, prefilter in all_filters:
+        # Skip filters whose required literal is not in the text
+        if prefilter is not None and prefilter.ignorecase and folded_text is None:
+            folded_text = modified_text.casefold()
+        if not prefilter_matches(prefilter, modified_text, folded_text):
+            metrics.increment("filters.skipped")
+            continue
+        
+        metrics.increment("filters.applied")
+        logger.info(f"Applying filter: pattern='{pattern.pattern}', replacement='{replacement}'")
         try:
-            new_text = re.sub(pattern, replacement, modified_text)
+            new_text = pattern.sub(replacement, modified_text)
             # Only log if a change was made
             if new_text != modified_text:
                 logger.info(f"Text changed: '{modified_text}' -> '{new_text}'")
+                folded_text = None
             modified_text = new_text
         except Exception as e:
-            logger.error(f"Error applying filter pattern '{pattern}': {e}")
+            logger.error(f"Error applying filter pattern '{pattern.pattern}': {e}")
     
     if modified_text != text:
         logger.info(f"Final modified text: {modified_text}")
     
     return modified_text
 
-def convert_timezone(text):
+# Common timestamp formats to try parsing
+TIMESTAMP_FORMATS = [
+    # Just time formats (for timestamps like 10:43:00)
+    "%H:%M:%S",
+    "%H:%M",
+    "%I:%M:%S %p",
+    "%I:%M %p",
+    # Full date+time formats
+    "%d/%m/%Y %H:%M",
+    "%d/%m/%Y %H:%M:%S",
+    "%d-%m-%Y %H:%M",
+    "%d-%m-%Y %H:%M:%S",
+    "%Y/%m/%d %H:%M",
+    "%Y/%m/%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d %H:%M:%S",
+    "%d/%m/%y %H:%M",
+    "%d/%m/%y %H:%M:%S",
+    "%d-%m-%y %H:%M",
+    "%d-%m-%y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%Y %H:%M:%S",
+    "%m-%d-%Y %H:%M",
+    "%m-%d-%Y %H:%M:%S",
+    # With AM/PM
+    "%d/%m/%Y %I:%M %p",
+    "%d/%m/%Y %I:%M:%S %p",
+    "%d-%m-%Y %I:%M %p",
+    "%d-%m-%Y %I:%M:%S %p",
+    "%Y/%m/%d %I:%M %p",
+    "%Y/%m/%d %I:%M:%S %p",
+    "%Y-%m-%d %I:%M %p",
+    "%Y-%m-%d %I:%M:%S %p",
+    "%d/%m/%y %I:%M %p",
+    "%d/%m/%y %I:%M:%S %p",
+    "%d-%m-%y %I:%M %p",
+    "%d-%m-%y %I:%M:%S %p",
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m-%d-%Y %I:%M %p",
+    "%m-%d-%Y %I:%M:%S %p",
+]
+
+# Formats without a date; these are placed on the reference day
+TIME_ONLY_FORMATS = {"%H:%M:%S", "%H:%M", "%I:%M:%S %p", "%I:%M %p"}
+
+@lru_cache(maxsize=TIMESTAMP_PARSE_CACHE_SIZE)
+def parse_timestamp(timestamp_str):
+    """
+    Parse a timestamp string with the first matching format.
+
+    Returns:
+        Tuple of (parsed datetime, format), or (None, None) if no format matches
+    """
+    for fmt in TIMESTAMP_FORMATS:
+        try:
+            return datetime.strptime(timestamp_str, fmt), fmt
+        except ValueError:
+            continue
+    return None, None
+
+register_cache("parsed_timestamps", parse_timestamp)
+
+def convert_timezone(text, reference_time=None):
     """
     Find timestamps in the text and convert them from SOURCE_TIMEZONE to TARGET_TIMEZONE
+
+    Time-only timestamps are taken to be on the day of reference_time (the
+    post's date) in SOURCE_TIMEZONE, or today if it is not given.
     """
     if not text:
         return text
@@ -45,55 +134,7 @@ def convert_timezone(text):
     logger.info(f"Attempting to convert timestamps in: {text}")
     logger.info(f"Source timezone: {SOURCE_TIMEZONE}, Target timezone: {TARGET_TIMEZONE}")
     
-    # Common timestamp formats to try parsing
-    formats = [
-        # Just time formats (for timestamps like 10:43:00)
-        "%H:%M:%S",
-        "%H:%M",
-        "%I:%M:%S %p",
-        "%I:%M %p",
-        # Full date+time formats
-        "%d/%m/%Y %H:%M",
-        "%d/%m/%Y %H:%M:%S",
-        "%d-%m-%Y %H:%M",
-        "%d-%m-%Y %H:%M:%S",
-        "%Y/%m/%d %H:%M",
-        "%Y/%m/%d %H:%M:%S",
-        "%Y-%m-%d %H:%M",
-        "%Y-%m-%d %H:%M:%S",
-        "%d/%m/%y %H:%M",
-        "%d/%m/%y %H:%M:%S",
-        "%d-%m-%y %H:%M",
-        "%d-%m-%y %H:%M:%S",
-        "%m/%d/%Y %H:%M",
-        "%m/%d/%Y %H:%M:%S",
-        "%m-%d-%Y %H:%M",
-        "%m-%d-%Y %H:%M:%S",
-        # With AM/PM
-        "%d/%m/%Y %I:%M %p",
-        "%d/%m/%Y %I:%M:%S %p",
-        "%d-%m-%Y %I:%M %p",
-        "%d-%m-%Y %I:%M:%S %p",
-        "%Y/%m/%d %I:%M %p",
-        "%Y/%m/%d %I:%M:%S %p",
-        "%Y-%m-%d %I:%M %p",
-        "%Y-%m-%d %I:%M:%S %p",
-        "%d/%m/%y %I:%M %p",
-        "%d/%m/%y %I:%M:%S %p",
-        "%d-%m-%y %I:%M %p",
-        "%d-%m-%y %I:%M:%S %p",
-        "%m/%d/%Y %I:%M %p",
-        "%m/%d/%Y %I:%M:%S %p",
-        "%m-%d-%Y %I:%M %p",
-        "%m-%d-%Y %I:%M:%S %p",
-    ]
-    
-    # Get timezone objects
-    source_tz = pytz.timezone(SOURCE_TIMEZONE)
-    target_tz = pytz.timezone(TARGET_TIMEZONE)
-    
     # Find all timestamp matches in text
-    modified_text = text
     all_timestamps = []
     
     # Try with main time pattern
@@ -116,63 +157,64 @@ def convert_timezone(text):
     
     logger.info(f"Total timestamps found: {len(all_timestamps)}")
     
-    # Process each timestamp
-    for match in all_timestamps:
+    # Process each timestamp, rebuilding the text from match positions so a
+    # converted value is never matched and converted again
+    day = None
+    pieces = []
+    last_end = 0
+    for match in sorted(all_timestamps, key=lambda m: m.start()):
+        if match.start() < last_end:
+            # Overlaps a timestamp that was already handled
+            continue
         timestamp_str = match.group(0)
-        parsed_time = None
-        matched_format = None  # Store the matching format
-        
-        # Try parsing with different formats
-        for fmt in formats:
-            try:
-                parsed_time = datetime.strptime(timestamp_str, fmt)
-                matched_format = fmt  # Save the format that worked
-                # Successfully parsed
-                break
-            except ValueError:
-                continue
+        parsed_time, matched_format = parse_timestamp(timestamp_str)
         
         if parsed_time and matched_format:
             try:
-                # If it's just a time format without a date, use today's date
-                if matched_format in ["%H:%M:%S", "%H:%M", "%I:%M:%S %p", "%I:%M %p"]:
-                    # Get current date in source timezone
-                    today = datetime.now(source_tz).date()
-                    # Combine with the parsed time
-                    combined_dt = datetime.combine(today, parsed_time.time())
-                    # Localize to source timezone
-                    source_time = source_tz.localize(combined_dt)
+                # If it's just a time format without a date, use the reference day
+                if matched_format in TIME_ONLY_FORMATS:
+                    if day is None:
+                        day = reference_day(SOURCE_TIMEZONE, reference_time)
+                    source_time = datetime.combine(day, parsed_time.time())
+                    # Time-only timestamps all fall on the reference day, so
+                    # its cached offset table serves every one of them
+                    target_time = convert_wall_time(SOURCE_TIMEZONE, TARGET_TIMEZONE, source_time)
                 else:
-                    # For timestamps with date and time
-                    source_time = source_tz.localize(parsed_time)
-                
-                # Convert to target timezone
-                target_time = source_time.astimezone(target_tz)
+                    # Timestamps with a date can be on any day; building a
+                    # table per date costs far more than converting directly
+                    source_time = parsed_time
+                    target_time = (pytz.timezone(SOURCE_TIMEZONE).localize(source_time)
+                                   .astimezone(pytz.timezone(TARGET_TIMEZONE)).replace(tzinfo=None))
                 
                 # Format the new timestamp using the same format that matched
                 new_timestamp = target_time.strftime(matched_format)
                 
-                # Replace the timestamp in the text
-                modified_text = modified_text.replace(timestamp_str, new_timestamp)
+                # Time-only output loses the date, so mark a change of day
+                if matched_format in TIME_ONLY_FORMATS and SHOW_DAY_ROLLOVER:
+                    days = (target_time.date() - source_time.date()).days
+                    if days:
+                        new_timestamp += DAY_ROLLOVER_FORMAT.format(days=days)
+                
+                pieces.append(text[last_end:match.start()])
+                pieces.append(new_timestamp)
+                last_end = match.end()
                 logger.info(f"Converted timestamp: '{timestamp_str}' -> '{new_timestamp}'")
             except Exception as e:
                 logger.error(f"Error converting timestamp {timestamp_str}: {e}")
         else:
             logger.warning(f"Could not parse timestamp: '{timestamp_str}'")
     
-    return modified_text
+    pieces.append(text[last_end:])
+    return "".join(pieces)
 
-def process_message_text(text):
+def process_message_text(text, reference_time=None):
     """
-    Process a message text by applying text filters and timezone conversion
+    Process a message text by running it through the configured pipeline stages
+    (by default text filters, then timezone conversion)
+
+    reference_time is the post's date, used for timestamps that have no date.
     """
     if not text:
         return text
     
-    # First apply text filters
-    filtered_text = apply_text_filters(text)
-    
-    # Then convert timestamps
-    processed_text = convert_timezone(filtered_text)
-    
-    return processed_text
+    return run_stages(text, get_pipeline()["stages"], reference_time)